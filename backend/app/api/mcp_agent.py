@@ -20,7 +20,7 @@ from app.schemas.mcp_agent import (
     AgentExecuteResponse
 )
 from pydantic import BaseModel
-from app.services.mcp import MCPService
+from app.services.mcp import get_mcp_service
 from app.services.tools import ToolService
 from app.services.mcp import MCPAgentService
 from app.services.mcp.mcp_unified_service import unified_service
@@ -61,7 +61,7 @@ async def call_tool(
         if unified_service._proxy_service:
             mcp_service = unified_service._proxy_service
         else:
-            mcp_service = MCPService()
+            mcp_service = get_mcp_service()
         logger.info(f"尝试获取工具 {tool_name} 的MCP客户端")
         client = await mcp_service.get_client_by_name(tool_name)
         logger.info(f"获取到的客户端: {client}, 工具ID: {tool.id if tool else 'None'}")
@@ -104,7 +104,7 @@ async def get_tool_capabilities(
         if unified_service._proxy_service:
             mcp_service = unified_service._proxy_service
         else:
-            mcp_service = MCPService()
+            mcp_service = get_mcp_service()
         client = await mcp_service.get_client_by_name(tool_name)
 
         if not client:
@@ -133,7 +133,7 @@ async def list_tools(
             tools = await unified_service._proxy_service.get_available_tools_with_capabilities()
         else:
             # 如果代理服务未启动，创建临时实例
-            mcp_service = MCPService()
+            mcp_service = get_mcp_service()
             tools = await mcp_service.get_available_tools_with_capabilities()
 
         # 转换格式以保持API兼容性
@@ -184,7 +184,7 @@ async def list_resources(
         if unified_service._proxy_service:
             mcp_service = unified_service._proxy_service
         else:
-            mcp_service = MCPService()
+            mcp_service = get_mcp_service()
         client = mcp_service.get_client(tool.id)
 
         if not client:
@@ -226,7 +226,7 @@ async def read_resource(
         if unified_service._proxy_service:
             mcp_service = unified_service._proxy_service
         else:
-            mcp_service = MCPService()
+            mcp_service = get_mcp_service()
         client = mcp_service.get_client(tool.id)
 
         if not client:
@@ -269,7 +269,7 @@ async def list_prompts(
         if unified_service._proxy_service:
             mcp_service = unified_service._proxy_service
         else:
-            mcp_service = MCPService()
+            mcp_service = get_mcp_service()
         client = mcp_service.get_client(tool.id)
 
         if not client:
@@ -308,7 +308,7 @@ async def get_prompt(
             return error_response(message="工具未启用", status_code=400)
 
         # 获取MCP客户端
-        mcp_service = MCPService()
+        mcp_service = get_mcp_service()
         client = mcp_service.get_client(tool.id)
 
         if not client:
@@ -446,7 +446,7 @@ async def get_tool_status(
             return error_response(message="工具不存在", status_code=404)
 
         # 获取MCP服务实例
-        mcp_service = MCPService()
+        mcp_service = get_mcp_service()
 
         # 获取实时状态
         status = await mcp_service.get_tool_status(tool.id)
@@ -490,7 +490,7 @@ async def reconnect_tool(
             return error_response(message="工具不存在", status_code=404)
 
         # 获取MCP服务实例
-        mcp_service = MCPService()
+        mcp_service = get_mcp_service()
 
         # 重启工具
         success = await mcp_service.restart_tool(tool.id, force=True)
@@ -526,7 +526,7 @@ async def disconnect_tool(
             return error_response(message="工具不存在", status_code=404)
 
         # 获取MCP服务实例
-        mcp_service = MCPService()
+        mcp_service = get_mcp_service()
 
         # 停止工具
         success = await mcp_service.stop_tool(tool.id, force=True)
@@ -20,7 +20,7 @@ from app.schemas.tool import (
     CategoryResponse,
 )
 from app.services.tools import ToolService
-from app.services.mcp import MCPService
+from app.services.mcp import get_mcp_service
 from app.utils.response import success_response, error_response
 from app.utils.pagination import simple_paginate as paginate
 
@@ -294,7 +294,7 @@ async def delete_tool(
     """删除工具"""
     try:
         tool_service = ToolService(db)
-        mcp_service = MCPService()
+        mcp_service = get_mcp_service()
 
         # 检查工具是否存在
         tool = tool_service.get_tool(tool_id)
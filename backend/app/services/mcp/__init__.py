@@ -1,6 +1,6 @@
 """MCP服务模块"""
 
-from .mcp_service import MCPService
+from .mcp_service import MCPService, get_mcp_service
 from .mcp_server import MCPSServer, get_mcp_server
 from .mcp_proxy_server import MCPProxyServer
 from .mcp_unified_service import MCPUnifiedService, unified_service
@@ -8,6 +8,7 @@ from .mcp_agent_service import MCPAgentService
 
 __all__ = [
     'MCPService',
+    'get_mcp_service',
     'MCPSServer',
     'get_mcp_server',
     'MCPProxyServer',
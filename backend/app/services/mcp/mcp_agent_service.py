@@ -5,8 +5,9 @@ from app.core import get_logger, LogLevel, LogCategory, create_log_context
 from app.core.unified_error import error_handler
 from app.core.unified_cache import cached
 import uuid
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, Optional, Any, Tuple, Deque, FrozenSet
 from concurrent.futures import ThreadPoolExecutor
 import json
 import time
@@ -21,13 +22,16 @@ from app.schemas.mcp_agent import (
     AgentMode,
     ToolCallRequest
 )
-from .mcp_service import MCPService
+from .mcp_service import MCPService, get_mcp_service
 from ..tools import ToolService
 from app.utils.mcp_client import MCPClient
 from app.models.tool import ToolStatus
 
 logger = get_logger(__name__)
 
+# 每个会话保留的已结束任务数量上限
+MAX_RECENT_TASKS = 256
+
 class AgentSession:
     """代理会话类"""
 
@@ -36,21 +40,68 @@ class AgentSession:
         self.session_id = session_id
         self.config = config
         self.tools = tools
+        # 用于步骤执行时的O(1)授权检查
+        self._tools_set: FrozenSet[int] = frozenset(tools)
         self.created_at = datetime.now()
-        self.last_activity = datetime.now()
+        # 时长计算使用单调时钟，墙钟时间仅在对外输出时换算
+        self._created_mono = time.monotonic()
+        self._last_activity_mono = self._created_mono
         self.status = "active"
-        self.tasks: Dict[str, 'AgentTask'] = {}
+        # 运行中/等待中的任务
+        self.active_tasks: Dict[str, 'AgentTask'] = {}
+        # 已结束的任务，超出上限时自动淘汰最旧的
+        self.recent_tasks: Deque['AgentTask'] = deque(maxlen=MAX_RECENT_TASKS)
         self.context: Dict[str, Any] = {}
+        # 累计统计，不受历史任务淘汰影响
+        self.total_tasks = 0
+        self.completed_tasks = 0
+        self.failed_tasks = 0
+        self.total_execution_time = 0.0
+
+    def add_task(self, task: 'AgentTask'):
+        """登记新任务"""
+        self.active_tasks[task.task_id] = task
+        self.total_tasks += 1
+
+    def archive_task(self, task: 'AgentTask'):
+        """将已结束的任务移入历史记录"""
+        if self.active_tasks.pop(task.task_id, None) is None:
+            return
+        self.recent_tasks.append(task)
+        if task.status == TaskStatus.COMPLETED:
+            self.completed_tasks += 1
+            self.total_execution_time += task.get_execution_time() or 0
+        elif task.status == TaskStatus.FAILED:
+            self.failed_tasks += 1
+
+    def get_task(self, task_id: str) -> Optional['AgentTask']:
+        """按ID查找任务"""
+        task = self.active_tasks.get(task_id)
+        if task is not None:
+            return task
+        for task in self.recent_tasks:
+            if task.task_id == task_id:
+                return task
+        return None
+
+    @property
+    def last_activity(self) -> datetime:
+        """最后活动时间"""
+        return self.created_at + timedelta(seconds=self._last_activity_mono - self._created_mono)
 
     @error_handler
     def update_activity(self):
         """更新最后活动时间"""
-        self.last_activity = datetime.now()
+        self._last_activity_mono = time.monotonic()
 
     @error_handler
     def is_expired(self, timeout: int = 3600) -> bool:
         """检查会话是否过期"""
-        return (datetime.now() - self.last_activity).total_seconds() > timeout
+        return time.monotonic() - self._last_activity_mono > timeout
+
+    def get_duration(self) -> float:
+        """获取会话持续时间（秒）"""
+        return time.monotonic() - self._created_mono
 
     @error_handler
     def to_dict(self) -> Dict[str, Any]:
@@ -62,7 +113,7 @@ class AgentSession:
             "created_at": self.created_at.isoformat(),
             "last_activity": self.last_activity.isoformat(),
             "status": self.status,
-            "task_count": len(self.tasks),
+            "task_count": self.total_tasks,
             "context": self.context
         }
 
@@ -76,43 +127,68 @@ class AgentTask:
         self.request = request
         self.status = TaskStatus.PENDING
         self.progress = 0.0
+        # 上一次对外通知的进度，用于合并高频的进度更新
+        self._last_emitted_progress = -1.0
         self.results: List[TaskResult] = []
         self.created_at = datetime.now()
-        self.started_at: Optional[datetime] = None
-        self.completed_at: Optional[datetime] = None
+        # 时长计算使用单调时钟，墙钟时间仅在对外输出时换算
+        self._created_mono = time.monotonic()
+        self._started_mono: Optional[float] = None
+        self._completed_mono: Optional[float] = None
         self.error: Optional[str] = None
         self.context: Dict[str, Any] = request.context or {}
 
+    def _to_wall_clock(self, mono: Optional[float]) -> Optional[datetime]:
+        """将单调时钟读数换算为墙钟时间"""
+        if mono is None:
+            return None
+        return self.created_at + timedelta(seconds=mono - self._created_mono)
+
+    @property
+    def started_at(self) -> Optional[datetime]:
+        """开始时间"""
+        return self._to_wall_clock(self._started_mono)
+
+    @property
+    def completed_at(self) -> Optional[datetime]:
+        """结束时间"""
+        return self._to_wall_clock(self._completed_mono)
+
     @error_handler
     def start(self):
         """开始任务"""
         self.status = TaskStatus.RUNNING
-        self.started_at = datetime.now()
+        self._started_mono = time.monotonic()
 
     @error_handler
     def complete(self):
         """完成任务"""
         self.status = TaskStatus.COMPLETED
-        self.completed_at = datetime.now()
+        self._completed_mono = time.monotonic()
         self.progress = 100.0
 
     @error_handler
     def fail(self, error: str):
         """任务失败"""
         self.status = TaskStatus.FAILED
-        self.completed_at = datetime.now()
+        self._completed_mono = time.monotonic()
         self.error = error
 
     @error_handler
     def cancel(self):
         """取消任务"""
         self.status = TaskStatus.CANCELLED
-        self.completed_at = datetime.now()
+        self._completed_mono = time.monotonic()
 
-    @error_handler
     def update_progress(self, progress: float):
-        """更新进度"""
-        self.progress = min(100.0, max(0.0, progress))
+        """更新进度
+
+        进度值直接写入，读取时再做范围限制；变化不足1%时不输出进度日志。
+        """
+        self.progress = progress
+        if progress - self._last_emitted_progress >= 1.0:
+            self._last_emitted_progress = progress
+            logger.debug(f"任务进度: {self.task_id} {progress:.1f}%", category=LogCategory.SYSTEM)
 
     @error_handler
     def add_result(self, result: TaskResult):
@@ -123,22 +199,24 @@ class AgentTask:
     @cached(ttl=300)
     def get_execution_time(self) -> Optional[float]:
         """获取执行时间"""
-        if self.started_at and self.completed_at:
-            return (self.completed_at - self.started_at).total_seconds()
+        if self._started_mono is not None and self._completed_mono is not None:
+            return self._completed_mono - self._started_mono
         return None
 
     @error_handler
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
+        started_at = self.started_at
+        completed_at = self.completed_at
         return {
             "task_id": self.task_id,
             "session_id": self.session_id,
             "status": self.status.value,
-            "progress": self.progress,
+            "progress": min(100.0, max(0.0, self.progress)),
             "results": [result.model_dump() for result in self.results],
             "created_at": self.created_at.isoformat(),
-            "started_at": self.started_at.isoformat() if self.started_at else None,
-            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+            "started_at": started_at.isoformat() if started_at else None,
+            "completed_at": completed_at.isoformat() if completed_at else None,
             "execution_time": self.get_execution_time(),
             "error": self.error,
             "context": self.context
@@ -148,9 +226,10 @@ class MCPAgentService:
     """MCP 代理服务管理器"""
 
     @error_handler
-    def __init__(self):
+    def __init__(self, mcp_service: Optional[MCPService] = None):
         self.sessions: Dict[str, AgentSession] = {}
-        self.mcp_service = MCPService()
+        # 默认复用全局 MCP 服务，避免重复的客户端连接和后台任务
+        self.mcp_service = mcp_service or get_mcp_service()
         self.executor = ThreadPoolExecutor(max_workers=10)
         self._cleanup_task: Optional[asyncio.Task] = None
         self._start_cleanup_task()
@@ -191,7 +270,7 @@ class MCPAgentService:
     ) -> AgentSession:
         """创建代理会话"""
         try:
-            session_id = str(uuid.uuid4())
+            session_id = uuid.uuid4().hex
             session = AgentSession(session_id, request.config, request.tools)
 
             # 验证工具是否可用
@@ -233,7 +312,7 @@ class MCPAgentService:
         return session
 
     @error_handler
-    def close_session(self, session_id: str) -> bool:
+    async def close_session(self, session_id: str) -> bool:
         """关闭代理会话"""
         try:
             session = self.sessions.get(session_id)
@@ -241,9 +320,10 @@ class MCPAgentService:
                 return False
 
             # 取消所有运行中的任务
-            for task in session.tasks.values():
+            for task in list(session.active_tasks.values()):
                 if task.status == TaskStatus.RUNNING:
                     task.cancel()
+                    session.archive_task(task)
 
             session.status = "closed"
             del self.sessions[session_id]
@@ -265,9 +345,9 @@ class MCPAgentService:
             if not session:
                 raise ValueError(f"会话不存在: {session_id}")
 
-            task_id = str(uuid.uuid4())
+            task_id = uuid.uuid4().hex
             task = AgentTask(task_id, session_id, request)
-            session.tasks[task_id] = task
+            session.add_task(task)
 
             # 异步执行任务
             asyncio.create_task(self._execute_task_async(task, session))
@@ -304,6 +384,8 @@ class MCPAgentService:
             error_msg = f"任务执行失败: {e}"
             logger.error(error_msg, category=LogCategory.SYSTEM)
             task.fail(error_msg)
+        finally:
+            session.archive_task(task)
 
     @error_handler
     def _execute_single_tool_mode(self, task: AgentTask, session: AgentSession):
@@ -332,7 +414,7 @@ class MCPAgentService:
 
             for i, result in enumerate(results):
                 if isinstance(result, Exception):
-                    step_result = TaskResult(
+                    step_result = TaskResult.model_construct(
                         step_id=task.request.steps[i].step_id,
                         status=TaskStatus.FAILED,
                         error=str(result),
@@ -411,12 +493,16 @@ class MCPAgentService:
         session: AgentSession,
         task: AgentTask
     ) -> TaskResult:
-        """执行单个步骤"""
-        start_time = time.time()
+        """执行单个步骤
+
+        步骤结果的字段均由内部生成，使用 model_construct 跳过 pydantic 校验。
+        """
+        started_at = datetime.now()
+        start_time = time.monotonic()
 
         try:
             # 检查工具是否在会话中
-            if step.tool_id not in session.tools:
+            if step.tool_id not in session._tools_set:
                 raise ValueError(f"工具 {step.tool_id} 不在会话工具列表中")
 
             # 调用工具
@@ -426,27 +512,27 @@ class MCPAgentService:
                 arguments=step.arguments
             )
 
-            execution_time = time.time() - start_time
+            execution_time = time.monotonic() - start_time
 
-            return TaskResult(
+            return TaskResult.model_construct(
                 step_id=step.step_id,
                 status=TaskStatus.COMPLETED,
                 result=result,
                 execution_time=execution_time,
-                started_at=datetime.fromtimestamp(start_time),
-                completed_at=datetime.now()
+                started_at=started_at,
+                completed_at=started_at + timedelta(seconds=execution_time)
             )
 
         except Exception as e:
-            execution_time = time.time() - start_time
+            execution_time = time.monotonic() - start_time
 
-            return TaskResult(
+            return TaskResult.model_construct(
                 step_id=step.step_id,
                 status=TaskStatus.FAILED,
                 error=str(e),
                 execution_time=execution_time,
-                started_at=datetime.fromtimestamp(start_time),
-                completed_at=datetime.now()
+                started_at=started_at,
+                completed_at=started_at + timedelta(seconds=execution_time)
             )
 
     @error_handler
@@ -457,7 +543,7 @@ class MCPAgentService:
         if not session:
             return None
 
-        return session.tasks.get(task_id)
+        return session.get_task(task_id)
 
     @error_handler
     def cancel_task(self, session_id: str, task_id: str) -> bool:
@@ -467,12 +553,13 @@ class MCPAgentService:
             if not session:
                 return False
 
-            task = session.tasks.get(task_id)
+            task = session.active_tasks.get(task_id)
             if not task:
                 return False
 
             if task.status == TaskStatus.RUNNING:
                 task.cancel()
+                session.archive_task(task)
                 logger.info(f"取消任务: {task_id}", category=LogCategory.SYSTEM)
                 return True
 
@@ -490,19 +577,14 @@ class MCPAgentService:
         if not session:
             return None
 
-        total_tasks = len(session.tasks)
-        completed_tasks = sum(1 for task in session.tasks.values() if task.status == TaskStatus.COMPLETED)
-        failed_tasks = sum(1 for task in session.tasks.values() if task.status == TaskStatus.FAILED)
-        running_tasks = sum(1 for task in session.tasks.values() if task.status == TaskStatus.RUNNING)
+        total_tasks = session.total_tasks
+        completed_tasks = session.completed_tasks
+        failed_tasks = session.failed_tasks
+        running_tasks = sum(1 for task in session.active_tasks.values() if task.status == TaskStatus.RUNNING)
 
         avg_execution_time = 0.0
         if completed_tasks > 0:
-            total_time = sum(
-                task.get_execution_time() or 0
-                for task in session.tasks.values()
-                if task.status == TaskStatus.COMPLETED
-            )
-            avg_execution_time = total_time / completed_tasks
+            avg_execution_time = session.total_execution_time / completed_tasks
 
         return {
             "session_id": session_id,
@@ -512,25 +594,26 @@ class MCPAgentService:
             "running_tasks": running_tasks,
             "success_rate": completed_tasks / total_tasks if total_tasks > 0 else 0,
             "avg_execution_time": avg_execution_time,
-            "session_duration": (datetime.now() - session.created_at).total_seconds(),
+            "session_duration": session.get_duration(),
             "last_activity": session.last_activity.isoformat()
         }
 
     @error_handler
-    def shutdown(self):
+    async def shutdown(self):
         """关闭服务"""
         try:
-            # 取消清理任务
+            # 取消清理任务并等待其真正退出
             if self._cleanup_task:
                 self._cleanup_task.cancel()
                 try:
-                    self._cleanup_task
+                    await self._cleanup_task
                 except asyncio.CancelledError:
                     pass
+                self._cleanup_task = None
 
             # 关闭所有会话
             for session_id in list(self.sessions.keys()):
-                self.close_session(session_id)
+                await self.close_session(session_id)
 
             # 关闭线程池
             self.executor.shutdown(wait=True)
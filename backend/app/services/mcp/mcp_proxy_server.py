@@ -2,7 +2,7 @@
 
 使用 FastMCP 的 Client 和代理功能实现会话隔离和并发安全的 MCP 代理服务。
 核心特性：
-- 会话隔离：每个请求获得独立的后端会话
+- 会话复用：按工具池化后端会话，避免每次调用重新启动 stdio 进程
 - 并发安全：支持多客户端同时访问
 - 传输桥接：支持不同传输协议之间的桥接
 - 高级 MCP 功能：自动转发采样、引导、日志和进度
@@ -10,50 +10,130 @@
 """
 
 import asyncio
-import json
 import logging
+import platform
+import re
+import shlex
 import time
-from typing import Dict, List, Optional, Any
-from datetime import datetime
+import weakref
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Any, Tuple
 from pathlib import Path
 
+import orjson
 from fastmcp import FastMCP, Client
+from fastmcp.client.transports import StdioTransport
+from fastmcp.server.proxy import FastMCPProxy
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app.core.database import SessionLocal
 from app.core import get_unified_config_manager, get_logger
 from app.models.tool import MCPTool, ToolStatus, ToolType
 from .mcp_service import MCPService
+from app.services.tools import ToolService
 from app.utils.exceptions import MCPConnectionError, MCPTimeoutError
 
 logger = get_logger(__name__)
 
+# 日志级别名称映射
+_LOG_LEVELS = {name: getattr(logging, name) for name in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")}
+
+# 后端会话池配置（秒）
+SESSION_IDLE_TIMEOUT = 300.0
+SESSION_MAX_AGE = 3600.0
+SESSION_SWEEP_INTERVAL = 60.0
+
+# 并发创建代理服务器的上限
+PROXY_CREATE_CONCURRENCY = 8
+
+def _iso_timestamp() -> str:
+    """生成毫秒精度的本地 ISO 时间戳"""
+    now = time.time()
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(now)) + f".{int(now * 1000) % 1000:03d}"
+
+def _npm_command(command: str) -> str:
+    """NPM 工具：确保通过 npx 启动"""
+    return command if command.startswith("npx") else f"npx {command}"
+
+def _python_command(command: str) -> str:
+    """Python 工具：确保通过 python 解释器启动"""
+    return command if command.startswith("python") else f"python {command}"
+
+# 外部工具命令分类表: (匹配模式, 命令转换函数)，按顺序取第一个匹配
+_COMMAND_PATTERNS = (
+    (re.compile(r"npx|npm"), _npm_command),
+    (re.compile(r"python|\.py$"), _python_command),
+)
+
+@dataclass
+class PooledSession:
+    """池化的后端 MCP 会话"""
+    client: Client
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    use_count: int = 0
+    held: bool = False  # 连接池是否持有该会话的连接
+
+@dataclass(frozen=True)
+class ToolLaunch:
+    """解析后的工具启动命令"""
+    cmd: str
+    args: Tuple[str, ...]
+
 class MCPProxyServer:
     """MCPS.ONE MCP 代理服务器"
 
     基于 FastMCP 2.0 最佳实践实现的代理服务器，提供：
-    - 会话隔离：每个请求获得独立的后端会话
+    - 会话复用：按工具池化后端会话，避免每次调用重新启动 stdio 进程
     - 并发安全：支持多客户端同时访问
     - 传输桥接：支持不同传输协议之间的桥接
     - 高级 MCP 功能：自动转发采样、引导、日志和进度
     """
 
+    # 存活的代理服务器实例，工具运行状态变化时统一清除运行中工具缓存
+    _instances: "weakref.WeakSet[MCPProxyServer]" = weakref.WeakSet()
+
     def __init__(self, name: str = "MCPS.ONE-Proxy"):
         self.name = name
         self.mcp_service = MCPService()
         self.proxy_servers: Dict[str, FastMCP] = {}  # tool_name -> proxy_server
         self.main_server = FastMCP(name)
-        self.start_time = time.time()
+        self.start_time = time.monotonic()
         self.request_count = 0
         self.error_count = 0
         self._initialized = False
 
+        # 运行中工具查询结果缓存: (过期时间, 工具行列表)
+        self._tools_cache: Optional[Tuple[float, List[Any]]] = None
+        self._tools_cache_ttl = 3.0
+        # 工具列表 JSON 缓存，工具查询结果或代理集合变化时失效
+        self._tools_json: Optional[str] = None
+
+        # 状态 JSON 模板，仅在代理集合变化时重建，计数和时间字段按次填充
+        self._status_template: Optional[str] = None
+        self._status_dirty = True
+
+        # 后端会话池: tool_name -> PooledSession
+        self._session_pool: Dict[str, PooledSession] = {}
+        self._sweeper_task: Optional[asyncio.Task] = None
+        # 后台重新预热任务: tool_name -> Task，同一工具同时只保留一个
+        self._warm_tasks: Dict[str, asyncio.Task] = {}
+
+        # 工具启动命令解析缓存: tool_name -> ToolLaunch
+        self._launch_cache: Dict[str, ToolLaunch] = {}
+
+        # 工具目录根路径，在创建代理服务器时解析一次
+        self._tools_root: Optional[Path] = None
+
+        MCPProxyServer._instances.add(self)
+
         # 配置日志级别
         try:
             from app.core.unified_config_manager import init_unified_config_manager
             config_manager = init_unified_config_manager()
             if config_manager:
-                log_level = getattr(logging, config_manager.get("mcp.server.log_level", "INFO").upper(), logging.INFO)
+                log_level = _LOG_LEVELS.get(config_manager.get("mcp.server.log_level", "INFO").upper(), logging.INFO)
                 logger.setLevel(log_level)
             else:
                 logger.setLevel(logging.INFO)
@@ -64,6 +144,31 @@ class MCPProxyServer:
         # 设置主服务器
         self._setup_main_server()
 
+    def _build_status_template(self) -> str:
+        """构建代理状态 JSON 模板
+
+        静态部分（名称、代理列表）预先序列化，动态字段保留为 str.format 占位符。
+        """
+        status_info = {
+            "server_name": self.name,
+            "uptime_seconds": "@@uptime_seconds@@",
+            "total_requests": "@@total_requests@@",
+            "total_errors": "@@total_errors@@",
+            "error_rate": "@@error_rate@@",
+            "active_proxies": len(self.proxy_servers),
+            "proxy_tools": list(self.proxy_servers.keys()),
+            "timestamp": "@@timestamp@@"
+        }
+        template = orjson.dumps(status_info, default=str, option=orjson.OPT_INDENT_2).decode()
+        template = template.replace("{", "{{").replace("}", "}}")
+        for field_name in ("uptime_seconds", "total_requests", "total_errors", "error_rate"):
+            template = template.replace(f'"@@{field_name}@@"', f"{{{field_name}}}")
+        return template.replace("@@timestamp@@", "{timestamp}")
+
+    def _incr_req(self) -> None:
+        """记录一次管理工具请求"""
+        self.request_count += 1
+
     async def initialize(self) -> None:
         """初始化 MCP 代理服务器"""
         if self._initialized:
@@ -78,6 +183,10 @@ class MCPProxyServer:
             # 创建代理服务器实例
             await self._create_proxy_servers()
 
+            # 启动空闲会话回收任务
+            if self._sweeper_task is None or self._sweeper_task.done():
+                self._sweeper_task = asyncio.create_task(self._sweep_session_pool())
+
             self._initialized = True
             logger.info("MCP 代理服务器初始化完成")
 
@@ -108,11 +217,22 @@ class MCPProxyServer:
             logger.info("停止 MCP 代理服务器...")
 
             # 停止 MCP 服务
-            if hasattr(self.mcp_service, 'stop'):
-                await self.mcp_service.stop()
+            await self.mcp_service.stop()
+
+            # 停止会话回收任务并关闭池化会话
+            if self._sweeper_task:
+                self._sweeper_task.cancel()
+                try:
+                    await self._sweeper_task
+                except asyncio.CancelledError:
+                    pass
+                self._sweeper_task = None
+            await self._close_session_pool()
 
             # 清理代理服务器
             self.proxy_servers.clear()
+            self._tools_json = None
+            self._status_dirty = True
 
             logger.info("MCP 代理服务器停止完成")
 
@@ -125,27 +245,10 @@ class MCPProxyServer:
 
         @self.main_server.tool()
         async def list_available_tools() -> str:
-            """列出所有可用的 MCP 工具"""
-            self.request_count += 1
+            """列出所有可用的 MCP 工具（紧凑 JSON）"""
+            self._incr_req()
             try:
-                db = SessionLocal()
-                tools = db.query(MCPTool).filter(
-                    MCPTool.status == ToolStatus.RUNNING
-                ).all()
-                db.close()
-
-                tool_list = []
-                for tool in tools:
-                    tool_info = {
-                        "name": tool.name,
-                        "description": tool.description,
-                        "category": tool.category,
-                        "status": tool.status.value,
-                        "proxy_available": tool.name in self.proxy_servers
-                    }
-                    tool_list.append(tool_info)
-
-                return json.dumps(tool_list, ensure_ascii=False, indent=2)
+                return self._get_tools_json()
             except Exception as e:
                 self.error_count += 1
                 logger.error(f"列出工具失败: {e}")
@@ -154,22 +257,20 @@ class MCPProxyServer:
         @self.main_server.tool()
         async def get_proxy_status() -> str:
             """获取代理服务器状态"""
-            self.request_count += 1
+            self._incr_req()
             try:
-                uptime = time.time() - self.start_time
-
-                status_info = {
-                    "server_name": self.name,
-                    "uptime_seconds": round(uptime, 2),
-                    "total_requests": self.request_count,
-                    "total_errors": self.error_count,
-                    "error_rate": round(self.error_count / max(self.request_count, 1) * 100, 2),
-                    "active_proxies": len(self.proxy_servers),
-                    "proxy_tools": list(self.proxy_servers.keys()),
-                    "timestamp": datetime.now().isoformat()
-                }
-
-                return json.dumps(status_info, ensure_ascii=False, indent=2)
+                if self._status_dirty or self._status_template is None:
+                    self._status_template = self._build_status_template()
+                    self._status_dirty = False
+
+                uptime = time.monotonic() - self.start_time
+                return self._status_template.format(
+                    uptime_seconds=round(uptime, 2),
+                    total_requests=self.request_count,
+                    total_errors=self.error_count,
+                    error_rate=round(self.error_count / max(self.request_count, 1) * 100, 2),
+                    timestamp=_iso_timestamp()
+                )
             except Exception as e:
                 self.error_count += 1
                 logger.error(f"获取代理状态失败: {e}")
@@ -178,9 +279,11 @@ class MCPProxyServer:
         @self.main_server.tool()
         async def refresh_proxies() -> str:
             """刷新代理服务器配置"""
-            self.request_count += 1
+            self._incr_req()
             try:
                 logger.info("刷新代理服务器配置...")
+                self._tools_cache = None
+                self._launch_cache.clear()
 
                 # 重新创建代理服务器
                 await self._create_proxy_servers()
@@ -194,24 +297,36 @@ class MCPProxyServer:
     async def _create_proxy_servers(self) -> None:
         """创建代理服务器实例"""
         try:
-            # 清理现有代理
+            # 清理现有代理及其池化会话
+            await self._close_session_pool()
             self.proxy_servers.clear()
+            self._tools_json = None
+            self._status_dirty = True
 
-            # 获取运行中的工具
-            db = SessionLocal()
-            tools = db.query(MCPTool).filter(
-                MCPTool.status == ToolStatus.RUNNING
-            ).all()
-            db.close()
+            # 重新解析工具目录
+            self._tools_root = self._resolve_tools_root()
+
+            # 获取运行中的工具（强制从数据库重新加载）
+            self._tools_cache = None
+            tools = self._load_running_tools()
 
             logger.info(f"找到 {len(tools)} 个运行中的工具，创建代理服务器...")
 
-            for tool in tools:
-                try:
-                    await self._create_tool_proxy(tool)
-                except Exception as e:
-                    logger.error(f"为工具 {tool.name} 创建代理失败: {e}")
-                    continue
+            semaphore = asyncio.Semaphore(PROXY_CREATE_CONCURRENCY)
+
+            async def create_one(tool) -> Optional[Tuple[str, FastMCP]]:
+                async with semaphore:
+                    try:
+                        proxy_server = await self._create_tool_proxy(tool)
+                    except Exception as e:
+                        logger.error(f"为工具 {tool.name} 创建代理失败: {e}")
+                        return None
+                return (tool.name, proxy_server) if proxy_server else None
+
+            results = await asyncio.gather(*(create_one(tool) for tool in tools))
+
+            # 所有代理构建完成后统一挂载
+            self._mount_proxies([result for result in results if result])
 
             logger.info(f"成功创建 {len(self.proxy_servers)} 个代理服务器")
 
@@ -219,48 +334,214 @@ class MCPProxyServer:
             logger.error(f"创建代理服务器失败: {e}")
             raise
 
-    async def _create_tool_proxy(self, tool: MCPTool) -> None:
-        """为单个工具创建代理服务器"""
+    @classmethod
+    def invalidate_running_tools(cls) -> None:
+        """清除所有实例的运行中工具缓存"""
+        for server in list(cls._instances):
+            server._tools_cache = None
+            server._tools_json = None
+
+    @classmethod
+    def _on_tool_status_change(cls, tool_id: int, old_status: ToolStatus, status: ToolStatus) -> None:
+        """工具进入或离开运行状态时，运行中工具缓存立即失效"""
+        if ToolStatus.RUNNING in (old_status, status):
+            cls.invalidate_running_tools()
+
+    def _load_running_tools(self) -> List[Any]:
+        """获取运行中的工具（带短期缓存）
+
+        仅查询代理所需的列，返回的行支持按属性访问。工具状态变化时由
+        _on_tool_status_change 主动清除缓存，TTL 只兜底其他进程的写入。
+        """
+        now = time.monotonic()
+        if self._tools_cache is not None and now < self._tools_cache[0]:
+            return self._tools_cache[1]
+
+        with SessionLocal() as db:
+            tools = db.execute(
+                select(
+                    MCPTool.name,
+                    MCPTool.description,
+                    MCPTool.category,
+                    MCPTool.status,
+                    MCPTool.command,
+                    MCPTool.type
+                ).where(MCPTool.status == ToolStatus.RUNNING)
+            ).all()
+
+        self._tools_cache = (now + self._tools_cache_ttl, tools)
+        self._tools_json = None
+        return tools
+
+    def _get_tools_json(self) -> str:
+        """获取序列化后的工具列表（缓存命中时直接复用）"""
+        tools = self._load_running_tools()
+        if self._tools_json is None:
+            proxy_names = frozenset(self.proxy_servers)
+            self._tools_json = orjson.dumps(
+                [
+                    {
+                        "name": tool.name,
+                        "description": tool.description,
+                        "category": tool.category,
+                        "status": tool.status.value,
+                        "proxy_available": tool.name in proxy_names
+                    }
+                    for tool in tools
+                ],
+                default=str
+            ).decode()
+        return self._tools_json
+
+    def _mount_proxies(self, proxies: List[Tuple[str, FastMCP]]) -> None:
+        """将一批代理服务器挂载到主服务器
+
+        挂载过程中不让出事件循环，主服务器的工具集合只在这一处集中变更。
+        """
+        for tool_name, proxy_server in proxies:
+            self.main_server.mount(proxy_server, tool_name)
+            self.proxy_servers[tool_name] = proxy_server
+
+        if proxies:
+            self._tools_json = None
+            self._status_dirty = True
+
+    async def _create_tool_proxy(self, tool: MCPTool) -> Optional[FastMCP]:
+        """为单个工具创建代理服务器（不挂载）"""
         try:
-            # 构建工具命令
-            command = self._build_tool_command(tool)
-            if not command:
-                logger.warning(f"无法为工具 {tool.name} 构建命令")
-                return
+            # 获取解析后的启动命令
+            launch = self._get_tool_launch(tool)
+            if launch is None:
+                return None
 
             # 创建 Client 连接到工具
-            from fastmcp.client.transports import StdioTransport
-            
-            # 解析命令和参数
-            command_parts = command.split()
-            if len(command_parts) == 0:
-                logger.error(f"工具 {tool.name} 命令为空")
-                return
-            
-            cmd = command_parts[0]
-            args = command_parts[1:] if len(command_parts) > 1 else []
-            
-            transport = StdioTransport(cmd, args)
+            transport = StdioTransport(launch.cmd, list(launch.args))
             client = Client(transport)
 
+            # 预热池化会话，后续调用复用同一个后端进程
+            session = PooledSession(client)
+            self._session_pool[tool.name] = session
+            await self._warm_session(tool.name, session)
+
             # 创建代理服务器实例
-            proxy_server = FastMCP.as_proxy(
-                client,
+            proxy_server = FastMCPProxy(
+                client_factory=self._pooled_client_factory(tool.name, session),
                 name=f"{tool.name}-Proxy"
             )
 
-            # 将代理服务器挂载到主服务器
-            self.main_server.mount(proxy_server, tool.name)
-
-            # 保存代理服务器引用
-            self.proxy_servers[tool.name] = proxy_server
-
             logger.info(f"为工具 {tool.name} 创建代理服务器成功")
+            return proxy_server
 
         except Exception as e:
             logger.error(f"为工具 {tool.name} 创建代理服务器失败: {e}")
             raise
 
+    def _pooled_client_factory(self, tool_name: str, session: PooledSession) -> Callable[[], Client]:
+        """为代理服务器构建复用池化会话的客户端工厂"""
+        def factory() -> Client:
+            session.last_used = time.monotonic()
+            session.use_count += 1
+            if not session.held:
+                # 会话已被回收：本次调用按需连接，同时在后台重新预热
+                self._schedule_warm(tool_name, session)
+            return session.client
+        return factory
+
+    def _schedule_warm(self, tool_name: str, session: PooledSession) -> None:
+        """在后台预热会话，已有未完成的预热任务时跳过"""
+        if tool_name in self._warm_tasks:
+            return
+        task = asyncio.create_task(self._warm_session(tool_name, session))
+        self._warm_tasks[tool_name] = task
+        task.add_done_callback(lambda done: self._discard_warm_task(tool_name, done))
+
+    def _discard_warm_task(self, tool_name: str, task: asyncio.Task) -> None:
+        """预热任务结束后移除登记，只移除仍是该任务本身的条目"""
+        if self._warm_tasks.get(tool_name) is task:
+            del self._warm_tasks[tool_name]
+
+    async def _warm_session(self, tool_name: str, session: PooledSession) -> None:
+        """建立并持有池化会话的连接"""
+        if session.held:
+            return
+        # 先占位避免并发预热重复连接；连接未完成（失败或被取消）时撤销占位
+        session.held = True
+        try:
+            await session.client.__aenter__()
+            session.created_at = time.monotonic()
+        except Exception as e:
+            session.held = False
+            logger.warning(f"工具 {tool_name} 后端会话预热失败，将按需连接: {e}")
+        except BaseException:
+            session.held = False
+            raise
+
+    async def _release_session(self, tool_name: str, session: PooledSession) -> None:
+        """释放连接池对会话连接的持有"""
+        if not session.held:
+            return
+        session.held = False
+        try:
+            await session.client.__aexit__(None, None, None)
+        except Exception as e:
+            logger.warning(f"关闭工具 {tool_name} 后端会话失败: {e}")
+
+    async def _close_session_pool(self) -> None:
+        """关闭所有池化会话"""
+        warm_tasks = list(self._warm_tasks.values())
+        for task in warm_tasks:
+            task.cancel()
+        await asyncio.gather(*warm_tasks, return_exceptions=True)
+
+        sessions = list(self._session_pool.items())
+        self._session_pool.clear()
+        for tool_name, session in sessions:
+            await self._release_session(tool_name, session)
+
+    async def _sweep_session_pool(self) -> None:
+        """定期回收空闲或超龄的池化会话"""
+        while True:
+            await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+            now = time.monotonic()
+            for tool_name, session in list(self._session_pool.items()):
+                if not session.held:
+                    continue
+                if (now - session.last_used > SESSION_IDLE_TIMEOUT
+                        or now - session.created_at > SESSION_MAX_AGE):
+                    logger.debug(f"回收工具 {tool_name} 的后端会话 (已使用 {session.use_count} 次)")
+                    await self._release_session(tool_name, session)
+
+    def _get_tool_launch(self, tool: MCPTool) -> Optional[ToolLaunch]:
+        """获取工具的启动命令和参数（按工具名缓存）"""
+        launch = self._launch_cache.get(tool.name)
+        if launch is not None:
+            return launch
+
+        command = self._build_tool_command(tool)
+        if not command:
+            logger.warning(f"无法为工具 {tool.name} 构建命令")
+            return None
+
+        command_parts = shlex.split(command, posix=platform.system() != "Windows")
+        if not command_parts:
+            logger.error(f"工具 {tool.name} 命令为空")
+            return None
+
+        launch = ToolLaunch(command_parts[0], tuple(command_parts[1:]))
+        self._launch_cache[tool.name] = launch
+        return launch
+
+    def _resolve_tools_root(self) -> Optional[Path]:
+        """从配置解析工具目录根路径"""
+        try:
+            config_manager = get_unified_config_manager()
+            if config_manager:
+                return Path(config_manager.get("data.dir", "./data")) / "tools"
+        except Exception:
+            # 如果配置管理器不可用，使用原始命令
+            pass
+        return None
+
     def _build_tool_command(self, tool: MCPTool) -> Optional[str]:
         """构建工具启动命令"""
         try:
@@ -273,24 +554,16 @@ class MCPProxyServer:
             # 处理不同类型的工具（基于工具类型字段）
             if tool.type == ToolType.EXTERNAL:
                 # 外部工具，检查是否为常见类型
-                if "npx" in command or "npm" in command:
-                    # NPM 工具
-                    if not command.startswith("npx"):
-                        command = f"npx {command}"
-                elif "python" in command or command.endswith(".py"):
-                    # Python 工具
-                    if not command.startswith("python"):
-                        command = f"python {command}"
-                elif not Path(command.split()[0]).is_absolute():
+                for pattern, transform in _COMMAND_PATTERNS:
+                    if pattern.search(command):
+                        return transform(command)
+
+                if not Path(shlex.split(command, posix=platform.system() != "Windows")[0]).is_absolute():
                     # 相对路径的可执行文件，添加工具目录前缀
-                    try:
-                        config_manager = get_unified_config_manager()
-                        if config_manager:
-                            tool_dir = Path(config_manager.get("data.dir", "./data")) / "tools" / tool.name
-                            command = str(tool_dir / command)
-                    except Exception:
-                        # 如果配置管理器不可用，使用原始命令
-                        pass
+                    if self._tools_root is None:
+                        self._tools_root = self._resolve_tools_root()
+                    if self._tools_root is not None:
+                        command = str(self._tools_root / tool.name / command)
 
             return command
 
@@ -344,6 +617,9 @@ class MCPProxyServer:
         """同步方式运行 HTTP 模式"""
         asyncio.run(self.run_http(host, port))
 
+# 状态变化时由 ToolService 回调，ToolService 本身不依赖代理服务器
+ToolService.add_status_listener(MCPProxyServer._on_tool_status_change)
+
 # 全局代理服务器实例
 _proxy_server_instance: Optional[MCPProxyServer] = None
 
@@ -4,16 +4,17 @@
 """
 
 import asyncio
-import json
 import logging
 import sys
+import threading
 import time
 import traceback
-from typing import Dict, List, Optional, Any, Sequence
+from typing import Awaitable, Callable, Dict, List, Optional, Any, Sequence, Tuple
 from datetime import datetime
 from contextlib import asynccontextmanager
 from concurrent.futures import ThreadPoolExecutor
 
+import orjson
 from fastmcp import FastMCP
 from mcp.types import (
     Tool,
@@ -23,6 +24,7 @@ from mcp.types import (
     ImageContent,
     EmbeddedResource
 )
+from sqlalchemy import func, select, text
 from sqlalchemy.orm import Session
 
 from app.core.database import SessionLocal
@@ -33,13 +35,106 @@ from .mcp_service import MCPService
 from ..base import BaseService
 from app.utils.mcp_client import MCPClient
 
+def _dumps(obj: Any, indent: bool = True) -> str:
+    """使用 orjson 序列化为 JSON 字符串（中文不转义）"""
+    option = orjson.OPT_NON_STR_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(obj, default=str, option=option).decode()
+
+def _format_content(parts: Sequence[Any]) -> str:
+    """将工具调用结果的内容块格式化为文本"""
+    out = []
+    for content in parts:
+        if isinstance(content, dict):
+            text = content.get('text')
+            if text is not None:
+                out.append(text)
+            elif 'data' in content:
+                out.append(f"[图片数据: {content.get('mimeType', 'unknown')}]")
+        else:
+            text = getattr(content, 'text', None)
+            if text is not None:
+                out.append(text)
+            elif getattr(content, 'data', None) is not None:
+                out.append(f"[图片数据: {content.mimeType}]")
+    return "\n".join(out)
+
 # 自定义序列化器，确保中文正确显示
 def custom_tool_serializer(obj: Any) -> str:
-    """自定义工具序列化器，确保中文字符正确处理"""
-    return json.dumps(obj, ensure_ascii=False, indent=2)
+    """自定义工具序列化器，确保中文字符正确处理
+
+    FastMCP 的 TextContent 只接受 str，已序列化的 bytes 直接解码，不再重复编码
+    """
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.decode()
+    return _dumps(obj)
 
 logger = get_logger(__name__)
 
+# 工具列表缓存有效期（秒），过期后先返回旧数据再后台刷新
+TOOL_CACHE_TTL = 5.0
+
+# 健康检查中数据库探测的超时时间（秒）
+DB_HEALTH_TIMEOUT = 0.5
+
+# 只读列表使用 Core 查询按列取值，避免 ORM 对象实例化开销
+_TOOL_SUMMARY_COLUMNS = (MCPTool.name, MCPTool.description, MCPTool.category, MCPTool.status)
+_TOOL_DETAIL_COLUMNS = (
+    MCPTool.id,
+    MCPTool.name,
+    MCPTool.description,
+    MCPTool.category,
+    MCPTool.status,
+    MCPTool.created_at,
+    MCPTool.updated_at,
+)
+
+def _tool_detail(row: Sequence[Any]) -> Dict[str, Any]:
+    """将工具详情行转换为字典"""
+    return {
+        "id": row[0],
+        "tool_name": row[1],  # 重命名避免与LogRecord的name字段冲突
+        "description": row[2],
+        "category": row[3],
+        "status": row[4].value,
+        "created_at": row[5],
+        "updated_at": row[6],
+    }
+
+async def _invoke_capability(client: Any, capability_name: str, input: str) -> str:
+    """调用工具的指定能力并格式化结果"""
+    try:
+        # 解析输入参数
+        try:
+            args = orjson.loads(input) if input else {}
+        except orjson.JSONDecodeError:
+            args = {"input": input}
+
+        result = await client.call_tool(capability_name, args)
+
+        if result.get("isError", False):
+            error_msg = result.get('content', [{}])[0].get('text', '未知错误') if result.get('content') else '未知错误'
+            return f"工具调用失败: {error_msg}"
+
+        # 格式化返回结果
+        return _format_content(result.get('content', []))
+
+    except Exception as e:
+        logger.error(f"调用工具 {capability_name} 失败: {e}")
+        return f"工具调用失败: {str(e)}"
+
+def _capability_tool(client: Any, capability_name: str) -> Callable[[str], Awaitable[str]]:
+    """生成单个能力的工具函数，只捕获客户端和能力名称，调用统一转发到 _invoke_capability
+
+    FastMCP 只接受函数并从其签名生成参数 schema，因此每个能力生成一个闭包
+    """
+    async def handler(input: str) -> str:
+        return await _invoke_capability(client, capability_name, input)
+
+    handler.__name__ = capability_name
+    return handler
+
 class MCPSServer(BaseService):
     """MCPS.ONE MCP 服务端"
 
@@ -65,8 +160,26 @@ class MCPSServer(BaseService):
         self.start_time = time.time()
         self.request_count = 0
         self.error_count = 0
+        # 计数器的读写都在锁内进行，保证读取到的请求数与错误数一致
+        self._counter_lock = threading.Lock()
         self.last_health_check = time.time()
         self._tools_registered = False
+
+        # 工具列表缓存，按是否包含能力分别缓存: include_capabilities -> (生成时间, 序列化结果)
+        self._tool_cache: Dict[bool, Tuple[float, str]] = {}
+        self._tool_cache_refresh: Dict[bool, asyncio.Task] = {}
+
+        # 工具详情缓存，mcps://tools 与 mcps://tool/{name} 共用: (生成时间, 序列化列表)
+        self._tool_details: Optional[Tuple[float, str]] = None
+        self._tools_by_name: Dict[str, Dict[str, Any]] = {}
+
+        # 进行中的刷新任务，并发请求共享同一结果
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        # 工具能力缓存，工具运行期间能力不变: tool_name -> 能力列表 / 序列化结果
+        self._capabilities_raw: Dict[str, List[Dict[str, Any]]] = {}
+        self._capabilities_json: Dict[str, str] = {}
+
         self._setup_server()
 
         # 配置日志级别
@@ -122,50 +235,29 @@ class MCPSServer(BaseService):
 
         # 注册管理工具
         @self.server.tool(description="列出所有可用的MCP工具")
-        async def list_available_tools() -> str:
+        async def list_available_tools(include_capabilities: bool = False) -> str:
             """列出所有可用的 MCP 工具"
 
             返回当前系统中所有可用的 MCP 工具列表，包括工具名称、描述、状态等信息
+
+            Args:
+                include_capabilities: 是否同时返回运行中工具的能力列表
             """
             try:
-                # 获取数据库中的工具
-                db = SessionLocal()
-                tools = db.query(MCPTool).all()
-                db.close()
-
-                tool_list = []
-                for tool in tools:
-                    tool_info = {
-                        "name": tool.name,
-                        "description": tool.description,
-                        "category": tool.category,
-                        "status": tool.status.value,
-                        "capabilities": []
-                    }
-
-                    # 尝试获取工具的能力信息
-                    try:
-                        if tool.status == ToolStatus.RUNNING:
-                            client = await self.mcp_service.get_client_by_name(tool.name)
-                            if client:
-                                capabilities = await client.list_tools()
-                                tool_info["capabilities"] = [
-                                    {
-                                        "name": cap.get("name", ""),
-                                        "description": cap.get("description", ""),
-                                        "inputSchema": cap.get("inputSchema", {})
-                                    }
-                                    for cap in capabilities
-                                ]
-                    except Exception as e:
-                        logger.warning(f"获取工具 {tool.name} 能力失败: {e}")
-
-                    tool_list.append(tool_info)
-
-                return json.dumps(tool_list, ensure_ascii=False)
+                cache = self._tool_cache.get(include_capabilities)
+                if cache is not None:
+                    # 缓存过期时后台刷新，本次直接返回旧数据
+                    refresh = self._tool_cache_refresh.get(include_capabilities)
+                    if time.monotonic() - cache[0] >= TOOL_CACHE_TTL and (refresh is None or refresh.done()):
+                        self._tool_cache_refresh[include_capabilities] = asyncio.create_task(
+                            self._revalidate_tool_cache(include_capabilities)
+                        )
+                    return cache[1]
+
+                return await self._refresh_tool_cache(include_capabilities)
             except Exception as e:
                 logger.error(f"列出工具失败: {e}")
-                return json.dumps([{"error": f"获取工具列表失败: {str(e)}"}], ensure_ascii=False)
+                return _dumps([{"error": f"获取工具列表失败: {str(e)}"}], indent=False)
 
         # 动态注册实际的工具将在服务器启动后执行
         self._tools_registered = False
@@ -183,8 +275,8 @@ class MCPSServer(BaseService):
             try:
                 # 解析参数
                 try:
-                    args = json.loads(arguments) if arguments else {}
-                except json.JSONDecodeError:
+                    args = orjson.loads(arguments) if arguments else {}
+                except orjson.JSONDecodeError:
                     return f"参数格式错误，必须是有效的 JSON: {arguments}"
 
                 # 获取 MCP 客户端
@@ -199,19 +291,7 @@ class MCPSServer(BaseService):
                     return f"工具调用失败: {result.get('content', [{}])[0].get('text', '未知错误') if result.get('content') else '未知错误'}"
 
                 # 格式化返回结果
-                content_parts = []
-                for content in result.get('content', []):
-                    if isinstance(content, dict):
-                        if 'text' in content:
-                            content_parts.append(content['text'])
-                        elif 'data' in content:
-                            content_parts.append(f"[图片数据: {content.get('mimeType', 'unknown')}]")
-                    elif hasattr(content, 'text'):
-                        content_parts.append(content.text)
-                    elif hasattr(content, 'data'):
-                        content_parts.append(f"[图片数据: {content.mimeType}]")
-
-                return "\n".join(content_parts)
+                return _format_content(result.get('content', []))
 
             except Exception as e:
                 logger.error(f"调用工具 {tool_name}.{tool_function} 失败: {e}")
@@ -225,22 +305,16 @@ class MCPSServer(BaseService):
                 tool_name: MCP 工具名称
             """
             try:
+                cached = self._capabilities_json.get(tool_name)
+                if cached is not None:
+                    return cached
+
                 client = await self.mcp_service.get_client_by_name(tool_name)
                 if not client:
                     return f"工具 {tool_name} 未找到或未运行"
 
-                capabilities = await client.list_tools()
-
-                cap_list = []
-                for cap in capabilities:
-                    cap_info = {
-                        "name": cap.get("name", ""),
-                        "description": cap.get("description", ""),
-                        "inputSchema": cap.get("inputSchema", {})
-                    }
-                    cap_list.append(cap_info)
-
-                return json.dumps(cap_list, ensure_ascii=False, indent=2)
+                self._cache_capabilities(tool_name, await client.list_tools())
+                return self._capabilities_json[tool_name]
 
             except Exception as e:
                 logger.error(f"获取工具 {tool_name} 能力失败: {e}")
@@ -255,6 +329,7 @@ class MCPSServer(BaseService):
             """
             try:
                 success = await self.mcp_service.start_tool_by_name(tool_name)
+                self._invalidate_tool_caches(tool_name)
                 if success:
                     return f"工具 {tool_name} 启动成功"
                 else:
@@ -272,6 +347,7 @@ class MCPSServer(BaseService):
             """
             try:
                 success = await self.mcp_service.stop_tool_by_name(tool_name)
+                self._invalidate_tool_caches(tool_name)
                 if success:
                     return f"工具 {tool_name} 停止成功"
                 else:
@@ -291,146 +367,38 @@ class MCPSServer(BaseService):
                 self.last_health_check = time.time()
                 uptime = time.time() - self.start_time
 
-                # 检查数据库连接
-                db_status = "healthy"
-                try:
-                    db = SessionLocal()
-                    db.execute("SELECT 1")
-                    db.close()
-                except Exception as e:
-                    db_status = f"unhealthy: {str(e)}"
-
-                # 检查MCP服务
-                mcp_status = "healthy"
-                try:
-                    # 简单检查MCP服务是否可用
-                    if not self.mcp_service:
-                        mcp_status = "unhealthy: MCP service not available"
-                except Exception as e:
-                    mcp_status = f"unhealthy: {str(e)}"
-
+                # 并发检查数据库连接和MCP服务
+                db_status, mcp_status = await asyncio.gather(
+                    self._check_db(),
+                    self._check_mcp(),
+                    return_exceptions=True
+                )
+                if isinstance(db_status, BaseException):
+                    db_status = f"unhealthy: {str(db_status)}"
+                if isinstance(mcp_status, BaseException):
+                    mcp_status = f"unhealthy: {str(mcp_status)}"
+
+                request_count, error_count = self._counter_snapshot()
                 health_info = {
                     "status": "healthy" if db_status == "healthy" and mcp_status == "healthy" else "unhealthy",
                     "uptime_seconds": round(uptime, 2),
-                    "request_count": self.request_count,
-                    "error_count": self.error_count,
+                    "request_count": request_count,
+                    "error_count": error_count,
                     "database_status": db_status,
                     "mcp_service_status": mcp_status,
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": datetime.now()
                 }
 
-                return json.dumps(health_info, ensure_ascii=False, indent=2)
+                return _dumps(health_info)
 
             except Exception as e:
-                self.error_count += 1
+                self._record_error()
                 logger.error(f"健康检查失败: {e}")
-                return json.dumps({
+                return _dumps({
                     "status": "unhealthy",
                     "error": str(e),
-                    "timestamp": datetime.now().isoformat()
-                }, ensure_ascii=False, indent=2)
-
-    async def _register_actual_tools(self):
-        """动态注册实际的MCP工具"""
-        try:
-            # 移除延迟，直接开始注册工具
-            logger.info("开始注册实际的MCP工具...")
-
-            db = SessionLocal()
-            tools = db.query(MCPTool).filter(
-                MCPTool.status == ToolStatus.RUNNING
-            ).all()
-            db.close()
-
-            logger.info(f"找到 {len(tools)} 个运行中的工具")
-
-            # 如果没有运行中的工具，直接返回
-            if not tools:
-                logger.info("没有运行中的工具需要注册")
-                return
-
-            for tool in tools:
-                try:
-                    # 添加超时控制，避免单个工具阻塞整个注册过程
-                    client = await asyncio.wait_for(
-                        self.mcp_service.get_client_by_name(tool.name),
-                        timeout=5.0
-                    )
-                    if not client:
-                        logger.warning(f"无法获取工具 {tool.name} 的客户端")
-                        continue
-
-                    # 获取工具的能力，添加超时控制
-                    capabilities = await asyncio.wait_for(
-                        client.list_tools(),
-                        timeout=10.0
-                    )
-                    logger.info(f"工具 {tool.name} 有 {len(capabilities)} 个能力")
-
-                    for cap in capabilities:
-                        # 为每个能力创建一个MCP工具
-                        tool_name = cap['name'] if isinstance(cap, dict) else cap.name
-                        tool_desc = cap['description'] if isinstance(cap, dict) else cap.description
-
-                        # 动态创建工具函数
-                        def create_tool_function(tool_client, capability_name):
-                            async def tool_function(input: str) -> str:
-                                try:
-                                    # 解析输入参数
-                                    import json
-                                    try:
-                                        args = json.loads(input) if input else {}
-                                    except json.JSONDecodeError:
-                                        args = {"input": input}
-
-                                    result = await tool_client.call_tool(capability_name, args)
-
-                                    if result.get("isError", False):
-                                        error_msg = result.get('content', [{}])[0].get('text', '未知错误') if result.get('content') else '未知错误'
-                                        return f"工具调用失败: {error_msg}"
-
-                                    # 格式化返回结果
-                                    content_parts = []
-                                    for content in result.get('content', []):
-                                        if isinstance(content, dict):
-                                            if 'text' in content:
-                                                content_parts.append(content['text'])
-                                            elif 'data' in content:
-                                                content_parts.append(f"[图片数据: {content.get('mimeType', 'unknown')}]")
-                                        elif hasattr(content, 'text'):
-                                            content_parts.append(content.text)
-                                        elif hasattr(content, 'data'):
-                                            content_parts.append(f"[图片数据: {content.mimeType}]")
-
-                                    return "\n".join(content_parts)
-
-                                except Exception as e:
-                                    logger.error(f"调用工具 {capability_name} 失败: {e}")
-                                    return f"工具调用失败: {str(e)}"
-
-                            return tool_function
-
-                        # 注册工具
-                        tool_func = create_tool_function(client, tool_name)
-
-                        # 使用装饰器方式注册工具
-                        decorated_func = self.server.tool(name=tool_name, description=tool_desc)(tool_func)
-
-                        logger.info(f"已注册工具: {tool_name}")
-
-                except asyncio.TimeoutError:
-                    logger.warning(f"注册工具 {tool.name} 超时，跳过")
-                    continue
-                except Exception as e:
-                    logger.error(f"注册工具 {tool.name} 失败: {e}")
-                    # 移除traceback打印，减少日志噪音
-                    continue
-
-            logger.info("实际MCP工具注册完成")
-
-        except Exception as e:
-            logger.error(f"动态注册工具失败: {e}")
-            # 不要因为工具注册失败而阻止服务启动
+                    "timestamp": datetime.now()
+                })
 
         @self.server.tool()
         async def get_metrics() -> str:
@@ -441,25 +409,26 @@ class MCPSServer(BaseService):
             try:
                 uptime = time.time() - self.start_time
 
-                # 获取工具统计
-                db = SessionLocal()
-                total_tools = db.query(MCPTool).count()
-                running_tools = db.query(MCPTool).filter(MCPTool.status == ToolStatus.RUNNING).count()
-                stopped_tools = db.query(MCPTool).filter(MCPTool.status == ToolStatus.STOPPED).count()
-                error_tools = db.query(MCPTool).filter(MCPTool.status == ToolStatus.ERROR).count()
-                db.close()
+                request_count, error_count = self._counter_snapshot()
+
+                # 获取工具统计（单次按状态分组计数）
+                status_counts = await asyncio.to_thread(self._count_tools_by_status)
+                total_tools = sum(status_counts.values())
+                running_tools = status_counts.get(ToolStatus.RUNNING, 0)
+                stopped_tools = status_counts.get(ToolStatus.STOPPED, 0)
+                error_tools = status_counts.get(ToolStatus.ERROR, 0)
 
                 metrics = {
                     "server_info": {
                         "name": "MCPS.ONE MCP Server",
                         "version": get_unified_config_manager().get("app.version", "1.0.0"),
                         "uptime_seconds": round(uptime, 2),
-                        "start_time": datetime.fromtimestamp(self.start_time).isoformat()
+                        "start_time": datetime.fromtimestamp(self.start_time)
                     },
                     "request_metrics": {
-                        "total_requests": self.request_count,
-                        "total_errors": self.error_count,
-                        "error_rate": round(self.error_count / max(self.request_count, 1) * 100, 2)
+                        "total_requests": request_count,
+                        "total_errors": error_count,
+                        "error_rate": round(error_count / max(request_count, 1) * 100, 2)
                     },
                     "tool_metrics": {
                         "total_tools": total_tools,
@@ -468,22 +437,255 @@ class MCPSServer(BaseService):
                         "error_tools": error_tools
                     },
                     "system_metrics": {
-                        "last_health_check": datetime.fromtimestamp(self.last_health_check).isoformat(),
+                        "last_health_check": datetime.fromtimestamp(self.last_health_check),
                         "health_check_enabled": get_unified_config_manager().get("mcp.health_check.enabled", True),
                         "metrics_enabled": get_unified_config_manager().get("mcp.metrics.enabled", True),
                     },
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": datetime.now()
                 }
 
-                return json.dumps(metrics, ensure_ascii=False, indent=2)
+                return _dumps(metrics)
 
             except Exception as e:
-                self.error_count += 1
+                self._record_error()
                 logger.error(f"获取指标失败: {e}")
-                return json.dumps({
+                return _dumps({
                     "error": str(e),
-                    "timestamp": datetime.now().isoformat()
-                }, ensure_ascii=False, indent=2)
+                    "timestamp": datetime.now()
+                })
+
+    def _record_error(self) -> None:
+        """错误计数加一"""
+        with self._counter_lock:
+            self.error_count += 1
+
+    def _counter_snapshot(self) -> Tuple[int, int]:
+        """一次性读取请求数和错误数"""
+        with self._counter_lock:
+            return self.request_count, self.error_count
+
+    def _probe_db(self) -> None:
+        """执行数据库连通性探测"""
+        with SessionLocal() as db:
+            db.execute(text("SELECT 1"))
+
+    async def _check_db(self) -> str:
+        """检查数据库连接，超过 500ms 视为不健康"""
+        try:
+            await asyncio.wait_for(asyncio.to_thread(self._probe_db), timeout=DB_HEALTH_TIMEOUT)
+            return "healthy"
+        except asyncio.TimeoutError:
+            return "unhealthy: database probe timed out"
+        except Exception as e:
+            return f"unhealthy: {str(e)}"
+
+    async def _check_mcp(self) -> str:
+        """检查MCP服务是否可用"""
+        if not self.mcp_service:
+            return "unhealthy: MCP service not available"
+        return "healthy"
+
+    # 数据库访问为同步操作，由调用方通过 asyncio.to_thread 在线程中执行，避免阻塞事件循环
+
+    def _load_tools(self, running_only: bool = False) -> List[MCPTool]:
+        """查询工具列表"""
+        with SessionLocal() as db:
+            query = db.query(MCPTool)
+            if running_only:
+                query = query.filter(MCPTool.status == ToolStatus.RUNNING)
+            return query.all()
+
+    def _select_tool_rows(self, columns: Sequence[Any]) -> List[Tuple[Any, ...]]:
+        """按列查询工具，返回元组行"""
+        with SessionLocal() as db:
+            return [tuple(row) for row in db.execute(select(*columns)).all()]
+
+    def _count_tools_by_status(self) -> Dict[ToolStatus, int]:
+        """按状态统计工具数量"""
+        with SessionLocal() as db:
+            rows = db.query(MCPTool.status, func.count(MCPTool.id)).group_by(MCPTool.status).all()
+        return {status: count for status, count in rows}
+
+    async def _build_tool_list(self, include_capabilities: bool = False) -> str:
+        """查询数据库生成序列化的工具列表，按需并发获取运行中工具的能力"""
+        # 获取数据库中的工具
+        rows = await asyncio.to_thread(self._select_tool_rows, _TOOL_SUMMARY_COLUMNS)
+
+        tool_list = [
+            {
+                "name": name,
+                "description": description,
+                "category": category,
+                "status": status.value,
+            }
+            for name, description, category, status in rows
+        ]
+
+        if include_capabilities:
+            for tool_info in tool_list:
+                tool_info["capabilities"] = []
+            running = [info for info, row in zip(tool_list, rows) if row[3] == ToolStatus.RUNNING]
+            cap_lists = await asyncio.gather(*(self._get_capabilities(info["name"]) for info in running))
+            for tool_info, cap_list in zip(running, cap_lists):
+                tool_info["capabilities"] = cap_list
+
+        return _dumps(tool_list, indent=False)
+
+    async def _get_tool_details(self) -> str:
+        """获取序列化的工具详情列表，同时维护按名称索引的详情"""
+        cache = self._tool_details
+        if cache is not None and time.monotonic() - cache[0] < TOOL_CACHE_TTL:
+            return cache[1]
+
+        rows = await asyncio.to_thread(self._select_tool_rows, _TOOL_DETAIL_COLUMNS)
+        details = [_tool_detail(row) for row in rows]
+        self._tools_by_name = {detail["tool_name"]: detail for detail in details}
+        result = _dumps(details)
+        self._tool_details = (time.monotonic(), result)
+        return result
+
+    async def _get_capabilities(self, tool_name: str) -> List[Dict[str, Any]]:
+        """获取工具能力，优先使用缓存，失败时返回空列表"""
+        cap_list = self._capabilities_raw.get(tool_name)
+        if cap_list is not None:
+            return cap_list
+        try:
+            client = await self.mcp_service.get_client_by_name(tool_name)
+            if client:
+                return self._cache_capabilities(tool_name, await client.list_tools())
+        except Exception as e:
+            logger.warning(f"获取工具 {tool_name} 能力失败: {e}")
+        return []
+
+    def _cache_capabilities(self, tool_name: str, capabilities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """缓存工具能力列表及其序列化结果"""
+        cap_list = [
+            {
+                "name": cap.get("name", ""),
+                "description": cap.get("description", ""),
+                "inputSchema": cap.get("inputSchema", {})
+            }
+            for cap in capabilities
+        ]
+        self._capabilities_raw[tool_name] = cap_list
+        self._capabilities_json[tool_name] = _dumps(cap_list)
+        return cap_list
+
+    def _invalidate_tool_caches(self, tool_name: str) -> None:
+        """工具状态变化后清除相关缓存"""
+        self._tool_cache.clear()
+        self._tool_details = None
+        self._capabilities_raw.pop(tool_name, None)
+        self._capabilities_json.pop(tool_name, None)
+
+    async def _refresh_tool_cache(self, include_capabilities: bool = False) -> str:
+        """重新生成工具列表并写入缓存，并发调用只执行一次查询"""
+        key = f"tools:{include_capabilities}"
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = self._inflight[key] = asyncio.ensure_future(self._store_tool_list(include_capabilities))
+            fut.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield 避免单个调用方取消时中断其他调用方共享的刷新任务
+        return await asyncio.shield(fut)
+
+    async def _store_tool_list(self, include_capabilities: bool) -> str:
+        """生成工具列表并写入缓存"""
+        result = await self._build_tool_list(include_capabilities)
+        self._tool_cache[include_capabilities] = (time.monotonic(), result)
+        return result
+
+    async def _revalidate_tool_cache(self, include_capabilities: bool = False) -> None:
+        """后台刷新工具列表缓存"""
+        try:
+            await self._refresh_tool_cache(include_capabilities)
+        except Exception as e:
+            logger.warning(f"后台刷新工具列表失败: {e}")
+
+    async def _discover_tool(self, tool: MCPTool) -> Optional[Tuple[MCPTool, Any, List[Dict[str, Any]]]]:
+        """获取单个工具的客户端和能力列表，失败时返回 None"""
+        try:
+            # 添加超时控制，避免单个工具阻塞整个注册过程
+            client = await asyncio.wait_for(
+                self.mcp_service.get_client_by_name(tool.name),
+                timeout=5.0
+            )
+            if not client:
+                logger.warning(f"无法获取工具 {tool.name} 的客户端")
+                return None
+
+            # 获取工具的能力，添加超时控制
+            capabilities = await asyncio.wait_for(
+                client.list_tools(),
+                timeout=10.0
+            )
+            self._cache_capabilities(tool.name, capabilities)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"工具 {tool.name} 有 {len(capabilities)} 个能力")
+            return tool, client, capabilities
+
+        except asyncio.TimeoutError:
+            logger.warning(f"注册工具 {tool.name} 超时，跳过")
+        except Exception as e:
+            logger.error(f"获取工具 {tool.name} 能力失败: {e}")
+        return None
+
+    async def _register_actual_tools(self):
+        """动态注册实际的MCP工具"""
+        try:
+            # 等待MCP服务就绪，而不是固定延迟
+            if not await self.mcp_service.wait_until_ready(timeout=10.0):
+                logger.warning("等待MCP服务就绪超时，继续注册工具")
+
+            logger.info("开始注册实际的MCP工具...")
+
+            tools = await asyncio.to_thread(self._load_tools, True)
+
+            logger.info(f"找到 {len(tools)} 个运行中的工具")
+
+            # 如果没有运行中的工具，直接返回
+            if not tools:
+                logger.info("没有运行中的工具需要注册")
+                return
+
+            # 并发获取所有工具的客户端和能力（同时预热能力缓存）
+            discovered = await asyncio.gather(*(self._discover_tool(tool) for tool in tools))
+
+            # 默认不为每个能力单独注册工具：客户端通过 call_tool 调用，
+            # 能力详情由 get_tool_capabilities 按需返回，避免 tools/list 过大
+            config_manager = get_unified_config_manager()
+            if not config_manager.get("mcp.server.expose_capability_tools", False):
+                logger.info("已缓存工具能力，未启用按能力注册工具")
+                return
+
+            # 逐项日志只在 DEBUG 级别输出，避免启动时为每个能力格式化日志字符串
+            log_each = logger.isEnabledFor(logging.DEBUG)
+            registered = 0
+            for tool, client, capabilities in (item for item in discovered if item):
+                try:
+                    for cap in capabilities:
+                        # 为每个能力创建一个MCP工具
+                        tool_name = cap['name'] if isinstance(cap, dict) else cap.name
+                        tool_desc = cap['description'] if isinstance(cap, dict) else cap.description
+
+                        # 注册工具，所有能力共用同一个调用入口
+                        self.server.tool(name=tool_name, description=tool_desc)(
+                            _capability_tool(client, tool_name)
+                        )
+
+                        registered += 1
+                        if log_each:
+                            logger.debug(f"已注册工具: {tool_name}")
+
+                except Exception as e:
+                    logger.error(f"注册工具 {tool.name} 失败: {e}")
+                    # 移除traceback打印，减少日志噪音
+                    continue
+
+            logger.info(f"实际MCP工具注册完成，共 {registered} 个能力")
+
+        except Exception as e:
+            logger.error(f"动态注册工具失败: {e}")
+            # 不要因为工具注册失败而阻止服务启动
 
     def _register_resources(self):
         """注册资源"""
@@ -492,25 +694,7 @@ class MCPSServer(BaseService):
         async def get_tools_resource() -> str:
             """获取所有工具的详细信息"""
             try:
-                db = SessionLocal()
-                tools = db.query(MCPTool).all()
-                db.close()
-
-                tools_data = []
-                for tool in tools:
-                    tool_data = {
-                    "id": tool.id,
-                    "tool_name": tool.name,  # 重命名避免与LogRecord的name字段冲突
-                    "description": tool.description,
-                    "category": tool.category,
-                    "status": tool.status.value,
-                    "created_at": tool.created_at.isoformat() if tool.created_at else None,
-                    "updated_at": tool.updated_at.isoformat() if tool.updated_at else None,
-                    "config": tool.config
-                }
-                    tools_data.append(tool_data)
-
-                return json.dumps(tools_data, ensure_ascii=False, indent=2)
+                return await self._get_tool_details()
             except Exception as e:
                 logger.error(f"获取工具资源失败: {e}")
                 return f"获取工具资源失败: {str(e)}"
@@ -519,42 +703,17 @@ class MCPSServer(BaseService):
         async def get_tool_resource(tool_name: str) -> str:
             """获取指定工具的详细信息"""
             try:
-                db = SessionLocal()
-                tool = db.query(MCPTool).filter(MCPTool.name == tool_name).first()
-                db.close()
+                await self._get_tool_details()
+                detail = self._tools_by_name.get(tool_name)
 
-                if not tool:
+                if detail is None:
                     return f"工具 {tool_name} 不存在"
 
-                tool_data = {
-                    "id": tool.id,
-                    "tool_name": tool.name,  # 重命名避免与LogRecord的name字段冲突
-                    "description": tool.description,
-                    "category": tool.category,
-                    "status": tool.status.value,
-                    "created_at": tool.created_at.isoformat() if tool.created_at else None,
-                    "updated_at": tool.updated_at.isoformat() if tool.updated_at else None,
-                    "config": tool.config
-                }
+                # 工具能力优先使用缓存，未命中时再向工具查询
+                tool_data = dict(detail)
+                tool_data["capabilities"] = await self._get_capabilities(tool_name)
 
-                # 获取工具能力
-                try:
-                    client = await self.mcp_service.get_client_by_name(tool_name)
-                    if client:
-                        capabilities = await client.list_tools()
-                        tool_data["capabilities"] = [
-                            {
-                                "name": cap.name,
-                                "description": cap.description,
-                                "inputSchema": cap.inputSchema
-                            }
-                            for cap in capabilities
-                        ]
-                except Exception as e:
-                    logger.warning(f"获取工具 {tool_name} 能力失败: {e}")
-                    tool_data["capabilities"] = []
-
-                return json.dumps(tool_data, ensure_ascii=False, indent=2)
+                return _dumps(tool_data)
             except Exception as e:
                 logger.error(f"获取工具 {tool_name} 资源失败: {e}")
                 return f"获取工具资源失败: {str(e)}"
@@ -708,7 +867,7 @@ class MCPSServer(BaseService):
                 raise
 
         except Exception as e:
-            self.error_count += 1
+            self._record_error()
             logger.error(f"HTTP模式启动失败: {e}")
             logger.error(f"错误详情: {traceback.format_exc()}")
             raise
@@ -733,7 +892,6 @@ class MCPSServer(BaseService):
     def run_sync_http(self, host: str = "127.0.0.1", port: int = 8001):
         """同步方式运行 HTTP 模式"""
         logger.info(f"启动 MCPS.ONE MCP 服务端 (HTTP 模式) - {host}:{port}")
-        import asyncio
         asyncio.run(self.server.run_streamable_http_async())
 
 
@@ -1,170 +1,352 @@
 import asyncio
-import json
-from app.core import get_logger, LogLevel, LogCategory, create_log_context
+import logging
+from app.core import get_logger
 import subprocess
-import signal
 import os
-import sys
 import platform
+import select
+import signal
 import threading
+from collections import OrderedDict, deque
+from functools import lru_cache
 from concurrent.futures import ThreadPoolExecutor
-from typing import Dict, List, Optional, Any, Tuple
-from datetime import datetime
-import psutil
+from typing import Callable, Dict, List, Optional, Any, Set, Tuple, TypeVar, Union
 from contextlib import asynccontextmanager
 import shlex
+import shutil
+import psutil
+from sqlalchemy.orm import Session
 
-from app.models.tool import MCPTool, ToolStatus, ToolType
-from app.schemas.tool import ConnectionConfig
+from app.models.tool import MCPTool, ToolStatus
 from app.schemas.log import SystemLogCreate, LogLevel, LogCategory
-from app.core import get_unified_config_manager
-from app.core import MCPSError, handle_error, error_handler, error_context
+from app.core import error_handler
 from app.utils.exceptions import (
     MCPConnectionError,
     MCPTimeoutError,
     ToolNotFoundError,
+    ToolConfigError,
     ProcessError,
     ProcessStartError,
-    ProcessStopError,
-    ProcessTimeoutError,
-    ProcessCrashError
+    ProcessStopError
 )
 from app.utils.error_handler import (
-    RetryConfig, CircuitBreakerConfig, with_retry, handle_errors
+    RetryConfig, CircuitBreakerConfig, mcp_endpoint
 )
-from app.core.unified_cache import cached
+from app.core.unified_cache import get_cache_manager
 # 进程监控功能已移除
 from app.utils.mcp_client import MCPClient
+from app.core.database import SessionLocal
 # 进程管理功能已移除
 from app.services.base.base_service import MCPBaseService
+from app.services.tools import ToolService
+from app.services.system import LogService
 
 logger = get_logger(__name__)
 
+T = TypeVar("T")
+
+# 工具列表缓存：使用固定键，工具启停时按键失效。
+# 保存装饰时的缓存管理器实例，确保失效操作与写入的是同一个缓存
+_tool_list_cache = get_cache_manager()
+_AVAILABLE_TOOLS_KEY = "mcp_service:available_tools"
+_AVAILABLE_TOOLS_WITH_CAPS_KEY = "mcp_service:available_tools_with_capabilities"
+
+# 系统日志异步写入队列的容量和单次批量写入条数
+LOG_QUEUE_SIZE = 1024
+LOG_BATCH_SIZE = 64
+
+# 工具状态异步写入时单次批量提交的最大条数
+STATUS_BATCH_SIZE = 64
+
+# 当前平台是否为 Windows，导入时确定
+_IS_WINDOWS = platform.system() == "Windows"
+
+# 自动启动工具时同时启动的最大数量
+AUTO_START_CONCURRENCY = min(16, (os.cpu_count() or 1) * 4)
+
+# 进程启动后的存活检查时间（秒）
+PROCESS_STARTUP_CHECK = 0.1
+
+# 停止进程时 SIGTERM 后的等待时间和 SIGKILL 后的等待时间（秒）
+PROCESS_TERM_GRACE = 5.0
+PROCESS_KILL_GRACE = 3.0
+
+# 健康检查间隔（秒），所有工具共用一个定时任务
+HEALTH_CHECK_INTERVAL = 30
+
+# 每个工具保留的标准错误输出行数
+STDERR_TAIL_LINES = 1000
+
+# 工具启停锁的缓存上限，超出后淘汰最久未使用且空闲的锁
+MAX_TOOL_LOCKS = 256
+
+@lru_cache(maxsize=256)
+def _split_command(command: str, posix: bool = True) -> Tuple[str, ...]:
+    """解析启动命令，按命令字符串缓存"""
+    return tuple(shlex.split(command, posix=posix))
+
+# 需要 cmd.exe 解释执行的内置命令和特殊字符
+_WINDOWS_SHELL_BUILTINS = frozenset({
+    "assoc", "call", "cd", "chdir", "cls", "copy", "date", "del", "dir", "echo", "erase", "for",
+    "ftype", "if", "md", "mkdir", "mklink", "move", "path", "pause", "rd", "ren", "rename",
+    "rmdir", "set", "start", "time", "title", "type", "ver", "vol"
+})
+_WINDOWS_SHELL_CHARS = frozenset("|&<>^%")
+
+def _windows_direct_argv(command: str) -> Optional[List[str]]:
+    """解析 Windows 启动命令，可直接启动时返回参数列表，需要 cmd.exe 时返回 None"""
+    if any(ch in _WINDOWS_SHELL_CHARS for ch in command):
+        return None
+    parts = [part.strip('"') for part in _split_command(command, posix=False)]
+    if not parts or parts[0].lower() in _WINDOWS_SHELL_BUILTINS:
+        return None
+    executable = shutil.which(parts[0])
+    if executable is None or executable.lower().endswith((".bat", ".cmd")):
+        return None
+    return [executable, *parts[1:]]
+
+def _find_missing_executable(command: str, cwd: Optional[str], path: Optional[str]) -> Optional[str]:
+    """检查 POSIX 启动命令的可执行文件，找不到时返回其名称"""
+    parts = _split_command(command)
+    if not parts:
+        return command
+    executable = parts[0]
+    if os.path.dirname(executable):
+        # 带路径的命令相对于工具工作目录解析
+        candidate = os.path.join(cwd or "", executable)
+        return None if os.access(candidate, os.X_OK) and not os.path.isdir(candidate) else executable
+    return None if shutil.which(executable, path=path) else executable
+
+def _signal_process_tree(process: subprocess.Popen, kill: bool = False) -> None:
+    """结束工具进程及其派生的子进程
+
+    POSIX 下工具以 start_new_session 启动，进程组号等于其 PID，直接向整个进程组发送 SIGTERM/SIGKILL；
+    Windows 先枚举全部子进程逐个结束，再结束工具进程本身
+    """
+    if _IS_WINDOWS:
+        try:
+            children = psutil.Process(process.pid).children(recursive=True)
+        except psutil.Error:
+            children = []
+        for child in children:
+            try:
+                if kill:
+                    child.kill()
+                else:
+                    child.terminate()
+            except psutil.Error:
+                pass
+        if kill:
+            process.kill()
+        else:
+            process.terminate()
+        return
+
+    try:
+        os.killpg(process.pid, signal.SIGKILL if kill else signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+    except PermissionError:
+        # 进程组中有无权发送信号的进程时，至少结束工具进程本身
+        if kill:
+            process.kill()
+        else:
+            process.terminate()
+
+def _pump_stderr(stream, tail: "deque[str]") -> None:
+    """持续读取进程标准错误输出写入环形缓冲，避免管道写满后工具进程阻塞；进程退出、管道关闭时结束"""
+    try:
+        for line in stream:
+            tail.append(line.rstrip("\r\n"))
+    except (OSError, ValueError):
+        pass
+
+def _open_exit_handle(pid: int) -> Optional[Tuple[int, Callable[[], None]]]:
+    """打开可由事件循环监听的进程退出句柄
+
+    Linux 使用 pidfd，BSD/macOS 使用 kqueue 的 NOTE_EXIT；返回 (fd, 关闭函数)，平台不支持或打开失败时返回 None
+    """
+    if hasattr(os, "pidfd_open"):
+        try:
+            fd = os.pidfd_open(pid)
+        except OSError:
+            return None
+        return fd, lambda: os.close(fd)
+
+    if hasattr(select, "kqueue"):
+        kq = select.kqueue()
+        try:
+            kq.control([select.kevent(
+                pid,
+                filter=select.KQ_FILTER_PROC,
+                flags=select.KQ_EV_ADD | select.KQ_EV_ONESHOT,
+                fflags=select.KQ_NOTE_EXIT
+            )], 0)
+        except OSError:
+            kq.close()
+            return None
+        return kq.fileno(), kq.close
+
+    return None
+
 class MCPService(MCPBaseService):
     """MCP 协议服务"""
 
-    def __init__(self):
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
         super().__init__("MCP Service")
+        # 数据库会话工厂，可注入以复用连接池或替换为测试会话
+        self._session_factory = session_factory
         self.processes: Dict[int, subprocess.Popen] = {}  # tool_id -> Process
         self.clients: Dict[int, Any] = {}  # tool_id -> Client
+        self.clients_by_name: Dict[str, MCPClient] = {}  # tool_name -> Client，按名称查找无需访问数据库
+        self._client_names: Dict[int, str] = {}  # tool_id -> tool_name
+        self._ready = asyncio.Event()  # 服务启动完成后置位
+
+        # 系统日志由后台任务批量写入，启停等流程只负责入队
+        self._log_queue: asyncio.Queue = asyncio.Queue(maxsize=LOG_QUEUE_SIZE)
+        self._log_worker: Optional[asyncio.Task] = None
+        self._dropped_logs = 0
+
+        # 清理、健康检查等非启停流程的状态写入由后台任务批量提交
+        self._status_queue: asyncio.Queue = asyncio.Queue()
+        self._status_worker: Optional[asyncio.Task] = None
+
+        # 所有工具的健康检查由同一个后台任务轮询
+        self._health_task: Optional[asyncio.Task] = None
+        self._health_tool_ids: Set[int] = set()
+        # 工具进程的基础环境变量，启动时只合并工具自身的配置
+        self._base_env = self._build_base_env()
+
+        # 进程创建在共享线程池中执行，避免每次启动新建线程池
+        self._start_executor = ThreadPoolExecutor(
+            max_workers=min(32, (os.cpu_count() or 2) * 2),
+            thread_name_prefix="mcp-start"
+        )
+        self._exit_watchers: Dict[int, Tuple[int, Callable[[], None]]] = {}  # tool_id -> (退出句柄, 关闭函数)
+        self._stderr_tails: Dict[int, "deque[str]"] = {}  # tool_id -> 最近的标准错误输出，停止后保留到下次启动
+        self._parked_clients: Dict[int, MCPClient] = {}  # 已停止工具保留会话的 HTTP 客户端，重启时复用
+
+        # 每个工具一把启停锁，避免并发启动时互相覆盖进程
+        self._locks: "OrderedDict[int, asyncio.Lock]" = OrderedDict()
+        self._lock_owners: Dict[int, asyncio.Task] = {}  # tool_id -> 持有锁的任务
 
         # 进程监控功能已移除
 
     # 进程监控功能已移除
 
-    @error_handler
-    async def _handle_process_crash(self, tool_id: int, metrics):
-        """处理进程崩溃"""
-        try:
-            logger.error(f"检测到进程崩溃: tool_id={tool_id}", category=LogCategory.SYSTEM)
-
-            # 清理资源
-            await self._cleanup_process(tool_id)
-
-            # 更新数据库状态
-            from app.services.tools import ToolService
-            from app.services.system import LogService
-            from app.core.database import get_db
-
-            db = next(get_db())
-            tool_service = ToolService(db)
-            log_service = LogService(db)
-            tool = tool_service.get_tool(tool_id)
-
-            # 记录系统日志
-            log_data = SystemLogCreate(
-                level=LogLevel.ERROR,
-                category=LogCategory.MCP,
-                message=f"MCP工具进程崩溃: {tool.name if tool else f'tool_id={tool_id}'}",
-                source="mcp_service",
-                tool_id=tool_id,
-                tool_name=tool.name if tool else None,
-                details={"metrics": metrics.__dict__ if hasattr(metrics, '__dict__') else str(metrics)}
-            )
-            log_service.create_system_log(log_data)
+    async def _run_db(self, fn: Callable[[Any], T]) -> T:
+        """在线程中以独立会话执行 ToolService 操作，避免同步数据库调用阻塞事件循环"""
+        def run() -> T:
+            with self._session_factory() as db:
+                return fn(ToolService(db))
 
-            if tool and tool.restart_on_failure:
-                # 尝试重启
-                restart_count = 0  # 进程监控功能已移除
-                if restart_count < tool.max_restart_attempts:
-                    logger.info(f"自动重启崩溃的工具: {tool.name}", category=LogCategory.SYSTEM)
+        return await asyncio.to_thread(run)
 
-                    # 记录重启日志
-                    restart_log = SystemLogCreate(
-                        level=LogLevel.INFO,
-                        category=LogCategory.MCP,
-                        message=f"自动重启崩溃的MCP工具: {tool.name}",
-                        source="mcp_service",
-                        tool_id=tool_id,
-                        tool_name=tool.name,
-                        details={"restart_count": restart_count + 1, "max_attempts": tool.max_restart_attempts}
-                    )
-                    log_service.create_system_log(restart_log)
-
-                    asyncio.create_task(self.restart_tool(tool_id, force=True))
-                else:
-                    tool_service.update_tool_status(
-                        tool_id,
-                        ToolStatus.ERROR,
-                        error_message=f"进程崩溃，重启次数已达上限 ({tool.max_restart_attempts})"
-                    )
-            else:
-                tool_service.update_tool_status(
-                    tool_id,
-                    ToolStatus.ERROR,
-                    error_message="进程崩溃"
-                )
-
-            db.close()
-
-        except Exception as e:
-            logger.error(f"处理进程崩溃失败: {e}", category=LogCategory.SYSTEM)
-
-    @error_handler
-    async def _handle_resource_limit_exceeded(self, tool_id: int, metrics):
-        """处理资源使用超限"""
+    async def _write_status(
+        self,
+        tool_id: int,
+        status: ToolStatus,
+        process_id: Optional[int] = None,
+        error_message: Optional[str] = None
+    ) -> None:
+        """在线程中写入并提交工具状态，提交后回到事件循环发送状态变更通知"""
+        old_status = await self._run_db(
+            lambda tool_service: tool_service.write_tool_status(tool_id, status, process_id, error_message)
+        )
+        if old_status is not None:
+            ToolService.notify_status_change(tool_id, old_status, status)
+
+    def _enqueue_log(self, log_data: SystemLogCreate) -> None:
+        """将系统日志放入写入队列，队列已满时丢弃并计数，不阻塞调用方"""
+        if self._log_worker is None or self._log_worker.done():
+            self._log_worker = asyncio.create_task(self._drain_logs())
         try:
-            logger.warning(
-                f"工具资源使用超限: tool_id={tool_id}, "
-                f"内存={metrics.memory_mb:.2f}MB, CPU={metrics.cpu_percent:.2f}%"
-            , category=LogCategory.SYSTEM)
-
-            # 更新数据库状态
-            from app.services.tools import ToolService
-            from app.core.database import get_db
-
-            db = next(get_db())
-            tool_service = ToolService(db)
-
-            error_msg = f"资源使用超限: 内存={metrics.memory_mb:.2f}MB, CPU={metrics.cpu_percent:.2f}%"
-            tool_service.update_tool_status(
-                tool_id,
-                ToolStatus.ERROR,
-                error_message=error_msg
-            )
-
-            db.close()
-
-        except Exception as e:
-            logger.error(f"处理资源超限失败: {e}", category=LogCategory.SYSTEM)
-
-    @error_handler
-    async def _handle_process_restart(self, tool_id: int):
-        """处理进程重启"""
+            self._log_queue.put_nowait(log_data)
+        except asyncio.QueueFull:
+            self._dropped_logs += 1
+            logger.warning(f"系统日志队列已满，已丢弃 {self._dropped_logs} 条", category=LogCategory.SYSTEM)
+
+    def _enqueue_logs(self, logs: List[SystemLogCreate]) -> None:
+        """将多条系统日志连续入队，后台任务会在同一批次中写入"""
+        for log_data in logs:
+            self._enqueue_log(log_data)
+
+    async def _drain_logs(self) -> None:
+        """后台批量写入系统日志"""
+        while True:
+            batch = [await self._log_queue.get()]
+            while len(batch) < LOG_BATCH_SIZE and not self._log_queue.empty():
+                batch.append(self._log_queue.get_nowait())
+            try:
+                await asyncio.to_thread(self._write_logs, batch)
+            except Exception as e:
+                logger.warning(f"写入系统日志失败: {e}", category=LogCategory.SYSTEM)
+            finally:
+                for _ in batch:
+                    self._log_queue.task_done()
+
+    def _write_logs(self, batch: List[SystemLogCreate]) -> None:
+        """在独立会话中批量写入系统日志（在线程中执行）"""
+        with self._session_factory() as db:
+            LogService(db).create_system_logs(batch)
+
+    async def _stop_log_worker(self) -> None:
+        """写完队列中剩余的日志后停止后台写入任务"""
+        await self._stop_queue_worker(self._log_queue, self._log_worker, "系统日志")
+        self._log_worker = None
+
+    def _enqueue_status(self, tool_id: int, status: ToolStatus, error_message: Optional[str] = None) -> None:
+        """将工具状态写入放入队列，由后台任务批量提交"""
+        if self._status_worker is None or self._status_worker.done():
+            self._status_worker = asyncio.create_task(self._drain_statuses())
+        self._status_queue.put_nowait((tool_id, status, error_message))
+
+    async def _drain_statuses(self) -> None:
+        """后台批量写入工具状态"""
+        while True:
+            batch = [await self._status_queue.get()]
+            while len(batch) < STATUS_BATCH_SIZE and not self._status_queue.empty():
+                batch.append(self._status_queue.get_nowait())
+            try:
+                # 入队后工具已被重新启动或停止的，以启停流程写入的状态为准
+                updates = [
+                    update for update in batch
+                    if self.tool_statuses.get(update[0], update[1].value) == update[1].value
+                ]
+                if updates:
+                    changes = await asyncio.to_thread(self._write_statuses, updates)
+                    for tool_id, old_status, status in changes:
+                        ToolService.notify_status_change(tool_id, old_status, status)
+            except Exception as e:
+                logger.warning(f"写入工具状态失败: {e}", category=LogCategory.SYSTEM)
+            finally:
+                for _ in batch:
+                    self._status_queue.task_done()
+
+    def _write_statuses(self, batch: List[Tuple[int, ToolStatus, Optional[str]]]) -> List[Tuple[int, ToolStatus, ToolStatus]]:
+        """在独立会话中批量写入工具状态（在线程中执行）"""
+        with self._session_factory() as db:
+            return ToolService(db).bulk_update_status(batch)
+
+    async def _stop_status_worker(self) -> None:
+        """写完队列中剩余的状态后停止后台写入任务"""
+        await self._stop_queue_worker(self._status_queue, self._status_worker, "工具状态")
+        self._status_worker = None
+
+    @staticmethod
+    async def _stop_queue_worker(queue: asyncio.Queue, worker: Optional[asyncio.Task], name: str) -> None:
+        """等待队列写完（最多 5 秒）后取消后台写入任务"""
+        if worker is None or worker.done():
+            return
         try:
-            logger.info(f"进程监控器触发重启: tool_id={tool_id}", category=LogCategory.SYSTEM)
-
-            # 更新数据库状态
-            from app.services.tools import ToolService
-            from app.core.database import get_db
-
-            db = next(get_db())
-            tool_service = ToolService(db)
-            tool_service.update_tool_status(tool_id, ToolStatus.STARTING)
-            db.close()
-
-        except Exception as e:
-            logger.error(f"处理进程重启失败: {e}", category=LogCategory.SYSTEM)
+            await asyncio.wait_for(queue.join(), timeout=5.0)
+        except asyncio.TimeoutError:
+            logger.warning(f"等待{name}写入超时", category=LogCategory.SYSTEM)
+        worker.cancel()
+        try:
+            await worker
+        except asyncio.CancelledError:
+            pass
 
     @error_handler
     async def _initialize_impl(self) -> None:
@@ -179,34 +361,70 @@ class MCPService(MCPBaseService):
     async def _start_impl(self) -> None:
         """具体的启动实现"""
         # 启动MCP代理服务的具体逻辑
-        pass
+        self._ensure_health_task()
+        self._ready.set()
+
+    async def wait_until_ready(self, timeout: float) -> bool:
+        """等待服务启动完成，超时返回 False"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
 
     @error_handler
     async def _stop_impl(self) -> None:
         """具体的停止实现"""
-        # 停止所有工具
-        for tool_id in list(self.clients.keys()):
-            await self.stop_tool(tool_id)
+        self._ready.clear()
+        # 并发停止所有工具
+        tool_ids = list(self.clients.keys())
+        results = await asyncio.gather(*(self.stop_tool(tool_id) for tool_id in tool_ids), return_exceptions=True)
+        self._log_teardown_errors("停止工具", tool_ids, results)
 
     @error_handler
     async def _cleanup_impl(self) -> None:
         """具体的清理实现"""
-        # 清理所有资源
-        for tool_id in list(self.clients.keys()):
-            await self.cleanup_tool(tool_id)
+        # 客户端和进程一次性并发清理
+        tool_ids = list(self.clients.keys() | self.processes.keys())
+        results = await asyncio.gather(*(self._fully_teardown(tool_id) for tool_id in tool_ids), return_exceptions=True)
+        self._log_teardown_errors("清理工具", tool_ids, results)
+        await self._close_parked_clients()
+
+    async def _fully_teardown(self, tool_id: int) -> None:
+        """关闭工具客户端并结束其进程，同时移除所有运行时记录"""
+        async with self._tool_lock(tool_id):
+            self._unwatch_exit(tool_id)
+            process = self.processes.pop(tool_id, None)
+            self.tool_statuses.pop(tool_id, None)
+
+            client = self._unregister_client(tool_id)
+            if client is not None:
+                try:
+                    await asyncio.wait_for(client.close(), timeout=5.0)
+                except asyncio.TimeoutError:
+                    logger.warning(f"关闭客户端超时 {tool_id}", category=LogCategory.SYSTEM)
+                except Exception as e:
+                    logger.warning(f"关闭客户端失败 {tool_id}: {e}", category=LogCategory.SYSTEM)
 
-        # 清理进程
-        for tool_id, process in list(self.processes.items()):
-            try:
-                if process.poll() is None:
-                    process.terminate()
-                    await asyncio.sleep(1)
-                    if process.poll() is None:
-                        process.kill()
-            except Exception as e:
-                self.logger.error(f"清理进程失败: {e}", category=LogCategory.SYSTEM)
-            finally:
-                del self.processes[tool_id]
+            if process is not None:
+                await self._graceful_kill(process)
+
+    async def _graceful_kill(self, process: subprocess.Popen) -> None:
+        """先终止进程组，最多等待 1 秒退出，仍未退出则强制结束"""
+        if process.poll() is not None:
+            return
+        _signal_process_tree(process)
+        try:
+            await self._wait_process(process, 1.0)
+        except subprocess.TimeoutExpired:
+            _signal_process_tree(process, kill=True)
+            await self._wait_process(process, PROCESS_KILL_GRACE)
+
+    def _log_teardown_errors(self, action: str, tool_ids: List[int], results: List[Any]) -> None:
+        """记录并发停止/清理中各工具的异常"""
+        for tool_id, result in zip(tool_ids, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"{action} {tool_id} 失败: {result}", category=LogCategory.SYSTEM)
 
     @error_handler
     async def _auto_start_tools(self) -> None:
@@ -223,22 +441,28 @@ class MCPService(MCPBaseService):
         try:
             logger.info("停止MCP代理服务...", category=LogCategory.SYSTEM)
 
-            # 停止所有工具
-            for tool_id in list(self.processes.keys()):
-                try:
-                    await self.stop_tool(tool_id, force=True)
-                except Exception as e:
-                    logger.warning(f"停止工具 {tool_id} 失败: {e}", category=LogCategory.SYSTEM)
+            # 并发停止所有工具
+            tool_ids = list(self.processes.keys())
+            results = await asyncio.gather(
+                *(self.stop_tool(tool_id, force=True) for tool_id in tool_ids),
+                return_exceptions=True
+            )
+            self._log_teardown_errors("停止工具", tool_ids, results)
 
-            # 关闭所有客户端
-            for tool_id, client in list(self.clients.items()):
-                try:
-                    await client.close()
-                except Exception as e:
-                    logger.warning(f"关闭客户端 {tool_id} 失败: {e}", category=LogCategory.SYSTEM)
+            # 并发关闭剩余客户端
+            clients = list(self.clients.items())
+            results = await asyncio.gather(*(client.close() for _, client in clients), return_exceptions=True)
+            self._log_teardown_errors("关闭客户端", [tool_id for tool_id, _ in clients], results)
 
             self.clients.clear()
+            self.clients_by_name.clear()
+            self._client_names.clear()
+            await self._close_parked_clients()
             self.processes.clear()
+            self.tool_statuses.clear()
+            await self._stop_health_task()
+            await self._stop_status_worker()
+            await self._stop_log_worker()
 
             logger.info("MCP代理服务停止完成", category=LogCategory.SYSTEM)
 
@@ -253,34 +477,13 @@ class MCPService(MCPBaseService):
         return self._initialized and len(self.processes) > 0
     
     @error_handler
-    @cached(ttl=300)
+    @_tool_list_cache.cache_result(_AVAILABLE_TOOLS_KEY, ttl=300)
     async def get_available_tools(self) -> List[Dict[str, Any]]:
         """获取可用工具列表"""
         tools = []
 
         try:
-            from app.services.tools import ToolService
-            from app.core.database import get_db
-
-            db = next(get_db())
-            tool_service = ToolService(db)
-
-            # 获取所有启用的工具
-            db_tools, _ = tool_service.get_tools(filters={'enabled': True})
-
-            for tool in db_tools:
-                tool_info = {
-                    "id": tool.id,
-                    "name": tool.name,
-                    "description": tool.description,
-                    "category": tool.category,
-                    "status": tool.status.value,
-                    "enabled": tool.enabled,
-                    "capabilities": None
-                }
-                tools.append(tool_info)
-
-            db.close()
+            tools = await self._run_db(self._load_enabled_tool_infos)
 
         except Exception as e:
             logger.error(f"获取可用工具列表失败: {e}", category=LogCategory.SYSTEM)
@@ -288,348 +491,337 @@ class MCPService(MCPBaseService):
         return tools
 
     @error_handler
-    @cached(ttl=300)
+    @_tool_list_cache.cache_result(_AVAILABLE_TOOLS_WITH_CAPS_KEY, ttl=300)
     async def get_available_tools_with_capabilities(self) -> List[Dict[str, Any]]:
         """获取可用工具列表（包含capabilities信息）"""
         tools = []
 
         try:
-            from app.services.tools import ToolService
-            from app.core.database import get_db
-
-            db = next(get_db())
-            tool_service = ToolService(db)
-
             # 获取所有启用的工具
-            db_tools, _ = tool_service.get_tools(filters={'enabled': True})
-
-            for tool in db_tools:
-                tool_info = {
-                    "id": tool.id,
-                    "name": tool.name,
-                    "description": tool.description,
-                    "category": tool.category,
-                    "status": tool.status.value,
-                    "enabled": tool.enabled,
-                    "capabilities": None
-                }
-
-                # 如果工具正在运行，尝试获取其capabilities
-                if tool.status == ToolStatus.RUNNING and tool.id in self.clients:
-                    try:
-                        client = self.clients[tool.id]
-                        logger.info(f"检查工具 {tool.name} (ID: {tool.id}) 的客户端连接状态", category=LogCategory.SYSTEM)
-                        if client:
-                            is_connected = await client.is_connected()
-                            logger.info(f"工具 {tool.name} 客户端连接状态: {is_connected}", category=LogCategory.SYSTEM)
-                            if is_connected:
-                                capabilities = await client.list_tools()
-                                tool_info["capabilities"] = capabilities
-                                logger.info(f"获取工具 {tool.name} 的capabilities成功，共 {len(capabilities, category=LogCategory.SYSTEM)} 个函数")
-                            else:
-                                logger.warning(f"工具 {tool.name} 的客户端未连接", category=LogCategory.SYSTEM)
-                        else:
-                            logger.warning(f"工具 {tool.name} 的客户端不存在", category=LogCategory.SYSTEM)
-                    except Exception as e:
-                        logger.error(f"获取工具 {tool.name} 的capabilities失败: {e}", exc_info=True, category=LogCategory.SYSTEM)
-                else:
-                    logger.info(f"工具 {tool.name} 状态: {tool.status.value}, 客户端存在: {tool.id in self.clients}", category=LogCategory.SYSTEM)
+            db_tools = await self._run_db(self._load_enabled_tool_infos)
+
+            # 只有数据库显示运行中且已有客户端的工具需要探测
+            running_ids = {
+                tool_info["id"] for tool_info in db_tools
+                if tool_info["status"] == ToolStatus.RUNNING.value
+            } & self.clients.keys()
+            live_tools = [tool_info for tool_info in db_tools if tool_info["id"] in running_ids]
+
+            # 并发探测各工具的连接状态和能力，数据库查询已在上面完成
+            results = await asyncio.gather(
+                *(self._probe_capabilities(tool_info) for tool_info in live_tools),
+                return_exceptions=True
+            )
+            for tool_info, result in zip(live_tools, results):
+                if isinstance(result, BaseException):
+                    logger.error(f"获取工具 {tool_info['name']} 的capabilities失败: {result}", category=LogCategory.SYSTEM)
 
-                tools.append(tool_info)
+            if logger.isEnabledFor(logging.DEBUG):
+                for tool_info in db_tools:
+                    if tool_info["id"] not in running_ids:
+                        logger.debug(f"工具 {tool_info['name']} 状态: {tool_info['status']}, 客户端存在: {tool_info['id'] in self.clients}", category=LogCategory.SYSTEM)
 
-            db.close()
+            tools = db_tools
 
         except Exception as e:
             logger.error(f"获取可用工具列表失败: {e}", category=LogCategory.SYSTEM)
 
         return tools
 
-    @with_retry(
-        RetryConfig(max_attempts=3, base_delay=1.0, exponential_base=2.0),
-        circuit_breaker_name="start_tool",
-        circuit_breaker_config=CircuitBreakerConfig(failure_threshold=5, recovery_timeout=60.0)
-    )
-    @error_handler
-    async def start_tool(self, tool_id: int, force: bool = False) -> bool:
-        """启动工具"""
-        try:
-            from app.services.tools import ToolService
-            from app.core.database import get_db
-
-            # 获取数据库会话
-            db = next(get_db())
-            tool_service = ToolService(db)
-
-            # 获取工具信息
-            tool = tool_service.get_tool(tool_id)
-            if not tool:
-                raise ToolNotFoundError(f"工具不存在: {tool_id}")
-
-            # 检查工具状态
-            if tool.status == ToolStatus.RUNNING and not force:
-                # 检查实际进程是否存在
-                actual_status = await self.get_tool_status(tool_id)
-                if actual_status == ToolStatus.RUNNING:
-                    logger.warning(f"工具已在运行: {tool.name}", category=LogCategory.SYSTEM)
-                    return True
-                else:
-                    # 数据库状态与实际状态不一致，需要重新启动
-                    logger.warning(f"工具状态不一致，数据库显示运行但进程不存在: {tool.name}，将重新启动", category=LogCategory.SYSTEM)
-                    # 清理状态并继续启动流程
-                    await self._cleanup_tool(tool_id)
-
-            if not tool.enabled and not force:
-                raise ProcessError(f"工具已禁用: {tool.name}")
-
-            # 停止现有进程（如果存在）
-            if tool_id in self.processes:
-                await self.stop_tool(tool_id, force=True)
-
-            # 更新状态为启动中
-            tool_service.update_tool_status(tool_id, ToolStatus.STARTING)
-
-            # 启动进程
-            process = await self._start_process_with_retry(tool)
-            if not process:
-                tool_service.update_tool_status(
-                    tool_id,
-                    ToolStatus.ERROR,
-                    error_message="进程启动失败"
-                )
-                raise ProcessStartError(f"工具进程启动失败: {tool.name}")
-
-            # 保存进程信息
-            self.processes[tool_id] = process
-
-            # 进程监控功能已移除
-
-            # 创建 MCP 客户端
-            client = await self._create_client_with_retry(tool, process)
-            if not client:
-                await self._cleanup_process(tool_id)
-                tool_service.update_tool_status(
-                    tool_id,
-                    ToolStatus.ERROR,
-                    error_message="MCP 客户端创建失败"
-                )
-                raise MCPConnectionError(f"MCP 客户端创建失败: {tool.name}")
-
-            self.clients[tool_id] = client
-
-            # 更新状态为运行中
-            tool_service.update_tool_status(
-                tool_id,
-                ToolStatus.RUNNING,
-                process_id=process.pid
-            )
+    async def _probe_capabilities(self, tool_info: Dict[str, Any]) -> Dict[str, Any]:
+        """检查运行中工具的客户端连接并获取其capabilities，结果写入 tool_info
 
-            logger.info(f"工具启动成功: {tool.name} (PID: {process.pid})", category=LogCategory.SYSTEM)
+        调用方只对数据库状态为运行中且已有客户端的工具调用
+        """
+        tool_id = tool_info["id"]
+        tool_name = tool_info["name"]
 
-            # 记录系统日志
-            try:
-                from app.services.system import LogService
-                log_service = LogService(db)
-                log_data = SystemLogCreate(
-                    level=LogLevel.INFO,
-                    category=LogCategory.TOOL,
-                    message=f"工具启动成功: {tool.name}",
-                    details={
-                        "tool_id": tool.id,
-                        "tool_name": tool.name,
-                        "process_id": process.pid,
-                        "tool_type": tool.type.value,
-                        "force_start": force
-                    }
-                )
-                log_service.create_system_log(log_data)
-            except Exception as log_error:
-                logger.warning(f"记录系统日志失败: {log_error}", category=LogCategory.SYSTEM)
-
-            # 启动健康检查
-            asyncio.create_task(self._health_check_loop(tool_id))
+        # 逐个工具的探测日志只在 DEBUG 级别输出，避免未开启时仍拼接字符串
+        log_debug = logger.isEnabledFor(logging.DEBUG)
 
-            return True
-
-        except (ProcessStartError, MCPConnectionError, ToolNotFoundError) as e:
-            logger.error(f"启动工具失败: {e}", category=LogCategory.SYSTEM)
-            await self._cleanup_tool(tool_id)
-            raise
+        try:
+            client = self.clients.get(tool_id)
+            if log_debug:
+                logger.debug(f"检查工具 {tool_name} (ID: {tool_id}) 的客户端连接状态", category=LogCategory.SYSTEM)
+            if client:
+                is_connected = await client.is_connected()
+                if log_debug:
+                    logger.debug(f"工具 {tool_name} 客户端连接状态: {is_connected}", category=LogCategory.SYSTEM)
+                if is_connected:
+                    capabilities = await client.list_tools()
+                    tool_info["capabilities"] = capabilities
+                    if log_debug:
+                        logger.debug(f"获取工具 {tool_name} 的capabilities成功，共 {len(capabilities)} 个函数", category=LogCategory.SYSTEM)
+                else:
+                    logger.warning(f"工具 {tool_name} 的客户端未连接", category=LogCategory.SYSTEM)
+            else:
+                logger.warning(f"工具 {tool_name} 的客户端不存在", category=LogCategory.SYSTEM)
         except Exception as e:
-            logger.error(f"启动工具失败: {e}", category=LogCategory.SYSTEM)
-            await self._cleanup_tool(tool_id)
-            raise ProcessStartError(f"工具启动失败: {e}")
-        finally:
-            db.close()
+            # 异常堆栈仅在 DEBUG 级别格式化
+            logger.error(f"获取工具 {tool_name} 的capabilities失败: {e}", exc_info=log_debug, category=LogCategory.SYSTEM)
+
+        return tool_info
+
+    @staticmethod
+    def _load_enabled_tool_infos(tool_service: Any) -> List[Dict[str, Any]]:
+        """查询所有启用的工具并转换为字典（在线程中执行）"""
+        db_tools, _ = tool_service.get_tools(filters={'enabled': True})
+        return [
+            {
+                "id": tool.id,
+                "name": tool.name,
+                "description": tool.description,
+                "category": tool.category,
+                "status": tool.status.value,
+                "enabled": tool.enabled,
+                "capabilities": None
+            }
+            for tool in db_tools
+        ]
 
-    @with_retry(
-        RetryConfig(max_attempts=2, base_delay=0.5, exponential_base=1.5),
-        circuit_breaker_name="stop_tool",
-        circuit_breaker_config=CircuitBreakerConfig(failure_threshold=3, recovery_timeout=30.0)
+    # 进程启动和客户端连接各自带重试，这里不再整体重试
+    @mcp_endpoint(
+        RetryConfig(max_attempts=1),
+        circuit_breaker_name="start_tool",
+        circuit_breaker_config=CircuitBreakerConfig(failure_threshold=5, recovery_timeout=60.0),
+        translate_errors=True
     )
-    @error_handler
-    async def stop_tool(self, tool_id: int, force: bool = False) -> bool:
-        """停止工具"""
-        try:
-            from app.services.tools import ToolService
-            from app.core.database import get_db
+    async def start_tool(self, tool: Union[int, MCPTool], force: bool = False) -> bool:
+        """启动工具，可传入工具ID或已查询到的工具对象"""
+        tool_id = tool if isinstance(tool, int) else tool.id
+        async with self._tool_lock(tool_id):
+            try:
+                # 获取工具信息，已查询到的工具对象直接使用，不再重复查询
+                if isinstance(tool, int):
+                    tool = await self._run_db(lambda tool_service: tool_service.get_tool(tool_id))
+                if not tool:
+                    raise ToolNotFoundError(f"工具不存在: {tool_id}")
+
+                # 检查工具状态
+                if tool.status == ToolStatus.RUNNING and not force:
+                    # 检查实际进程是否存在
+                    actual_status = await self.get_tool_status(tool_id)
+                    if actual_status == ToolStatus.RUNNING:
+                        logger.warning(f"工具已在运行: {tool.name}", category=LogCategory.SYSTEM)
+                        return True
+                    else:
+                        # 数据库状态与实际状态不一致，需要重新启动
+                        logger.warning(f"工具状态不一致，数据库显示运行但进程不存在: {tool.name}，将重新启动", category=LogCategory.SYSTEM)
+                        # 清理状态并继续启动流程
+                        await self._cleanup_tool(tool_id)
 
-            # 获取数据库会话
-            db = next(get_db())
-            tool_service = ToolService(db)
+                if not tool.enabled and not force:
+                    raise ProcessError(f"工具已禁用: {tool.name}")
 
-            # 获取工具信息
-            tool = tool_service.get_tool(tool_id)
-            if not tool:
-                raise ToolNotFoundError(f"工具不存在: {tool_id}")
+                # 停止现有进程（如果存在）
+                if tool_id in self.processes:
+                    await self.stop_tool(tool_id, force=True)
 
-            # 检查工具状态
-            if tool.status == ToolStatus.STOPPED and not force:
-                logger.warning(f"工具已停止: {tool.name}", category=LogCategory.SYSTEM)
-                return True
+                # 启动进程
+                process = await self._start_process(tool)
 
-            # 更新状态为停止中
-            tool_service.update_tool_status(tool_id, ToolStatus.STOPPING)
+                # 保存进程信息
+                self.processes[tool_id] = process
+                self._set_tool_state(tool_id, ToolStatus.STARTING)
 
-            # 关闭 MCP 客户端
-            if tool_id in self.clients:
-                try:
-                    await asyncio.wait_for(self.clients[tool_id].close(), timeout=5.0)
-                except asyncio.TimeoutError:
-                    logger.warning(f"关闭 MCP 客户端超时: {tool.name}", category=LogCategory.SYSTEM)
-                except Exception as e:
-                    logger.warning(f"关闭 MCP 客户端失败: {e}", category=LogCategory.SYSTEM)
-                finally:
-                    del self.clients[tool_id]
+                # 进程监控功能已移除
 
-            # 停止进程
-            success = await self._stop_process_with_retry(tool_id, force)
+                # 创建 MCP 客户端
+                client = await self._create_client(tool, process)
 
-            # 进程监控功能已移除
+                self._register_client(tool, client)
+                self._set_tool_state(tool_id, ToolStatus.RUNNING)
+                self._watch_exit(tool_id, process)
+
+                # 更新状态为运行中，状态与变更日志在线程中一次提交
+                await self._write_status(tool_id, ToolStatus.RUNNING, process_id=process.pid)
 
-            # 更新状态
-            if success:
-                tool_service.update_tool_status(tool_id, ToolStatus.STOPPED)
-                logger.info(f"工具停止成功: {tool.name}", category=LogCategory.SYSTEM)
+                logger.info(f"工具启动成功: {tool.name} (PID: {process.pid})", category=LogCategory.SYSTEM)
 
                 # 记录系统日志
                 try:
-                    from app.services.system import LogService
-                    log_service = LogService(db)
                     log_data = SystemLogCreate(
                         level=LogLevel.INFO,
                         category=LogCategory.TOOL,
-                        message=f"工具停止成功: {tool.name}",
+                        message=f"工具启动成功: {tool.name}",
                         details={
                             "tool_id": tool.id,
                             "tool_name": tool.name,
-                            "force_stop": force
+                            "process_id": process.pid,
+                            "tool_type": tool.type.value,
+                            "force_start": force
                         }
                     )
-                    log_service.create_system_log(log_data)
+                    self._enqueue_log(log_data)
                 except Exception as log_error:
                     logger.warning(f"记录系统日志失败: {log_error}", category=LogCategory.SYSTEM)
-            else:
-                tool_service.update_tool_status(
-                    tool_id,
-                    ToolStatus.ERROR,
-                    error_message="进程停止失败"
-                )
-                raise ProcessStopError(f"工具进程停止失败: {tool.name}")
 
-            return success
+                # 加入健康检查
+                self._watch_health(tool_id)
 
-        except (ProcessStopError, ToolNotFoundError) as e:
-            logger.error(f"停止工具失败: {e}", category=LogCategory.SYSTEM)
-            raise
-        except Exception as e:
-            logger.error(f"停止工具失败: {e}", category=LogCategory.SYSTEM)
-            raise ProcessStopError(f"工具停止失败: {e}")
-        finally:
-            db.close()
+                return True
 
-    @error_handler
-    async def restart_tool(self, tool_id: int, force: bool = False) -> bool:
-        """重启工具"""
-        try:
-            from app.services.tools import ToolService
-            from app.core.database import get_db
-
-            # 获取数据库会话
-            db = next(get_db())
-            tool_service = ToolService(db)
-
-            # 增加重启计数
-            tool = tool_service.increment_restart_count(tool_id)
-
-            # 检查重启次数限制
-            if tool.restart_count > tool.max_restart_attempts and not force:
-                tool_service.update_tool_status(
-                    tool_id,
-                    ToolStatus.ERROR,
-                    error_message=f"重启次数超过限制 ({tool.max_restart_attempts})"
-                )
-                return False
+            except (ProcessStartError, MCPConnectionError, ToolNotFoundError) as e:
+                logger.error(f"启动工具失败: {e}", category=LogCategory.SYSTEM)
+                await self._cleanup_tool(tool_id, error_message=str(e))
+                raise
+            except Exception as e:
+                logger.error(f"启动工具失败: {e}", category=LogCategory.SYSTEM)
+                await self._cleanup_tool(tool_id, error_message=f"工具启动失败: {e}")
+                raise ProcessStartError(f"工具启动失败: {e}")
+            finally:
+                await self._invalidate_tool_lists()
 
-            # 停止工具
-            await self.stop_tool(tool_id, force=True)
+    @mcp_endpoint(
+        RetryConfig(max_attempts=2, base_delay=0.5, exponential_base=1.5),
+        circuit_breaker_name="stop_tool",
+        circuit_breaker_config=CircuitBreakerConfig(failure_threshold=3, recovery_timeout=30.0),
+        translate_errors=True
+    )
+    async def stop_tool(self, tool: Union[int, MCPTool], force: bool = False) -> bool:
+        """停止工具，可传入工具ID或已查询到的工具对象"""
+        tool_id = tool if isinstance(tool, int) else tool.id
+        async with self._tool_lock(tool_id):
+            try:
+                # 获取工具信息，已查询到的工具对象直接使用，不再重复查询
+                if isinstance(tool, int):
+                    tool = await self._run_db(lambda tool_service: tool_service.get_tool(tool_id))
+                if not tool:
+                    raise ToolNotFoundError(f"工具不存在: {tool_id}")
+
+                # 检查工具状态
+                if tool.status == ToolStatus.STOPPED and not force:
+                    logger.warning(f"工具已停止: {tool.name}", category=LogCategory.SYSTEM)
+                    return True
 
-            # 等待1秒后重启
-            await asyncio.sleep(1)
+                # 断开 MCP 客户端
+                try:
+                    await asyncio.wait_for(self._release_client(tool_id), timeout=5.0)
+                except asyncio.TimeoutError:
+                    logger.warning(f"关闭 MCP 客户端超时: {tool.name}", category=LogCategory.SYSTEM)
+                except Exception as e:
+                    logger.warning(f"关闭 MCP 客户端失败: {e}", category=LogCategory.SYSTEM)
 
-            # 启动工具
-            return await self.start_tool(tool_id, force)
+                # 停止进程
+                success = await self._stop_process(tool_id, force)
 
-        except Exception as e:
-            logger.error(f"重启工具失败: {e}", category=LogCategory.SYSTEM)
-            raise
-        finally:
-            db.close()
+                # 进程监控功能已移除
+
+                # 更新状态
+                self._set_tool_state(tool_id, ToolStatus.STOPPED if success else ToolStatus.ERROR)
+                if success:
+                    await self._write_status(tool_id, ToolStatus.STOPPED)
+                    logger.info(f"工具停止成功: {tool.name}", category=LogCategory.SYSTEM)
+
+                    # 记录系统日志
+                    try:
+                        log_data = SystemLogCreate(
+                            level=LogLevel.INFO,
+                            category=LogCategory.TOOL,
+                            message=f"工具停止成功: {tool.name}",
+                            details={
+                                "tool_id": tool.id,
+                                "tool_name": tool.name,
+                                "force_stop": force
+                            }
+                        )
+                        self._enqueue_log(log_data)
+                    except Exception as log_error:
+                        logger.warning(f"记录系统日志失败: {log_error}", category=LogCategory.SYSTEM)
+                else:
+                    await self._write_status(tool_id, ToolStatus.ERROR, error_message="进程停止失败")
+                    raise ProcessStopError(f"工具进程停止失败: {tool.name}")
+
+                return success
+
+            except (ProcessStopError, ToolNotFoundError) as e:
+                logger.error(f"停止工具失败: {e}", category=LogCategory.SYSTEM)
+                raise
+            except Exception as e:
+                logger.error(f"停止工具失败: {e}", category=LogCategory.SYSTEM)
+                raise ProcessStopError(f"工具停止失败: {e}")
+            finally:
+                await self._invalidate_tool_lists()
 
     @error_handler
-    @cached(ttl=300)
-    async def get_tool_status(self, tool_id: int) -> Optional[ToolStatus]:
-        """获取工具实时状态"""
-        try:
-            logger.debug(f"检查工具状态: tool_id={tool_id}", category=LogCategory.SYSTEM)
+    async def restart_tool(self, tool_id: int, force: bool = False) -> bool:
+        """重启工具"""
+        async with self._tool_lock(tool_id):
+            try:
+                # 增加重启计数
+                tool = await self._run_db(lambda tool_service: tool_service.increment_restart_count(tool_id))
 
-            # 检查进程是否存在
-            if tool_id not in self.processes:
-                logger.debug(f"工具进程不存在: tool_id={tool_id}", category=LogCategory.SYSTEM)
-                return ToolStatus.STOPPED
+                # 检查重启次数限制
+                if tool.restart_count > tool.max_restart_attempts and not force:
+                    await self._write_status(
+                        tool_id,
+                        ToolStatus.ERROR,
+                        error_message=f"重启次数超过限制 ({tool.max_restart_attempts})"
+                    )
+                    return False
 
-            process = self.processes[tool_id]
-            logger.debug(f"工具进程存在: tool_id={tool_id}, pid={process.pid}", category=LogCategory.SYSTEM)
-
-            # 检查进程是否还在运行
-            poll_result = process.poll()
-            if poll_result is not None:
-                # 进程已结束
-                logger.debug(f"工具进程已结束: tool_id={tool_id}, exit_code={poll_result}", category=LogCategory.SYSTEM)
-                await self._cleanup_process(tool_id)
-                return ToolStatus.STOPPED
-
-            logger.debug(f"工具进程正在运行: tool_id={tool_id}", category=LogCategory.SYSTEM)
-
-            # 检查 MCP 客户端连接
-            if tool_id in self.clients:
-                client = self.clients[tool_id]
-                logger.debug(f"检查MCP客户端连接: tool_id={tool_id}", category=LogCategory.SYSTEM)
-                is_connected = await client.is_connected()
-                logger.debug(f"MCP客户端连接状态: tool_id={tool_id}, connected={is_connected}", category=LogCategory.SYSTEM)
-                if is_connected:
-                    return ToolStatus.RUNNING
-                else:
-                    return ToolStatus.ERROR
-            else:
-                logger.debug(f"MCP客户端不存在: tool_id={tool_id}", category=LogCategory.SYSTEM)
+                # 停止工具
+                await self.stop_tool(tool_id, force=True)
 
-            return ToolStatus.STARTING
+                # 等待旧进程完全退出后重启，最多等待 1 秒
+                await self._wait_for_process_gone(tool_id, max_wait=1.0)
 
-        except Exception as e:
-            logger.error(f"获取工具状态失败: {e}", category=LogCategory.SYSTEM)
-            return ToolStatus.ERROR
+                # 启动工具
+                return await self.start_tool(tool_id, force)
+
+            except Exception as e:
+                logger.error(f"重启工具失败: {e}", category=LogCategory.SYSTEM)
+                raise
+
+    async def _wait_for_process_gone(self, tool_id: int, max_wait: float = 1.0) -> None:
+        """以指数退避等待工具进程退出并被移除，超过 max_wait 后直接返回"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_wait
+        delay = 0.02
+        while True:
+            process = self.processes.get(tool_id)
+            if process is None or process.poll() is not None:
+                return
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(min(delay, remaining))
+            delay *= 2
 
-    @with_retry(
+    @error_handler
+    async def get_tool_status(self, tool_id: int) -> Optional[ToolStatus]:
+        """获取工具实时状态
+
+        状态由启动、停止流程和健康检查循环写入 tool_statuses，这里只读缓存，不做进程或连接探测
+        """
+        return ToolStatus(self.tool_statuses.get(tool_id, ToolStatus.STOPPED.value))
+
+    def get_tool_stderr(self, tool_id: int, limit: Optional[int] = None) -> List[str]:
+        """获取工具最近的标准错误输出，limit 指定时只返回最后 limit 行"""
+        lines = list(self._stderr_tails.get(tool_id, ()))
+        return lines[-limit:] if limit else lines
+
+    def _drain_stderr(self, tool_id: int, process: subprocess.Popen) -> None:
+        """启动后台线程读取进程的标准错误输出
+
+        标准输出由 MCP 客户端按协议读取，这里只处理标准错误；管道是同步文件对象，用守护线程读取可兼容各平台事件循环
+        """
+        if process.stderr is None:
+            return
+        tail: "deque[str]" = deque(maxlen=STDERR_TAIL_LINES)
+        self._stderr_tails[tool_id] = tail
+        threading.Thread(
+            target=_pump_stderr,
+            args=(process.stderr, tail),
+            name=f"mcp-stderr-{tool_id}",
+            daemon=True
+        ).start()
+
+    def _set_tool_state(self, tool_id: int, status: ToolStatus) -> None:
+        """更新工具的运行状态缓存"""
+        self.tool_statuses[tool_id] = status.value
+
+    @mcp_endpoint(
         RetryConfig(max_attempts=3, base_delay=0.5, exponential_base=2.0),
         circuit_breaker_name="execute_tool_method",
         circuit_breaker_config=CircuitBreakerConfig(failure_threshold=5, recovery_timeout=30.0)
@@ -672,22 +864,13 @@ class MCPService(MCPBaseService):
     async def start_tool_by_name(self, tool_name: str, force: bool = False) -> bool:
         """通过工具名称启动工具"""
         try:
-            from app.services.tools import ToolService
-            from app.core.database import get_db
-
-            # 获取数据库会话
-            db = next(get_db())
-            tool_service = ToolService(db)
-
             # 通过名称获取工具
-            tool = tool_service.get_tool_by_name(tool_name)
+            tool = await self._run_db(lambda tool_service: tool_service.get_tool_by_name(tool_name))
             if not tool:
                 raise ToolNotFoundError(f"工具不存在: {tool_name}")
 
-            db.close()
-
-            # 调用现有的start_tool方法
-            return await self.start_tool(tool.id, force=force)
+            # 调用现有的start_tool方法，直接传入工具对象避免再次按ID查询
+            return await self.start_tool(tool, force=force)
 
         except Exception as e:
             logger.error(f"通过名称启动工具失败: {e}", category=LogCategory.SYSTEM)
@@ -697,22 +880,13 @@ class MCPService(MCPBaseService):
     async def stop_tool_by_name(self, tool_name: str, force: bool = False) -> bool:
         """通过工具名称停止工具"""
         try:
-            from app.services.tools import ToolService
-            from app.core.database import get_db
-
-            # 获取数据库会话
-            db = next(get_db())
-            tool_service = ToolService(db)
-
             # 通过名称获取工具
-            tool = tool_service.get_tool_by_name(tool_name)
+            tool = await self._run_db(lambda tool_service: tool_service.get_tool_by_name(tool_name))
             if not tool:
                 raise ToolNotFoundError(f"工具不存在: {tool_name}")
 
-            db.close()
-
-            # 调用现有的stop_tool方法
-            return await self.stop_tool(tool.id, force=force)
+            # 调用现有的stop_tool方法，直接传入工具对象避免再次按ID查询
+            return await self.stop_tool(tool, force=force)
 
         except Exception as e:
             logger.error(f"通过名称停止工具失败: {e}", category=LogCategory.SYSTEM)
@@ -720,7 +894,6 @@ class MCPService(MCPBaseService):
 
 
     @error_handler
-    @cached(ttl=300)
     async def get_tool_capabilities(self, tool_id: int) -> Dict[str, Any]:
         """获取工具能力"""
         try:
@@ -752,7 +925,7 @@ class MCPService(MCPBaseService):
             logger.error(f"列出工具失败: {e}", category=LogCategory.SYSTEM)
             raise
 
-    @with_retry(
+    @mcp_endpoint(
         RetryConfig(max_attempts=3, base_delay=0.5, exponential_base=2.0),
         circuit_breaker_name="call_tool",
         circuit_breaker_config=CircuitBreakerConfig(failure_threshold=5, recovery_timeout=30.0)
@@ -792,36 +965,83 @@ class MCPService(MCPBaseService):
             raise MCPConnectionError(f"工具调用失败: {e}")
 
     @error_handler
-    @cached(ttl=300)
     async def get_client(self, tool_id: int) -> Optional[MCPClient]:
         """获取指定工具的MCP客户端"""
         return self.clients.get(tool_id)
 
     @error_handler
-    @cached(ttl=300)
     async def get_client_by_name(self, tool_name: str) -> Optional[MCPClient]:
         """通过工具名称获取MCP客户端"""
-        try:
-            from app.services.tools import ToolService
-            from app.core.database import get_db
-
-            db = next(get_db())
-            tool_service = ToolService(db)
-            tool = tool_service.get_tool_by_name(tool_name)
-            db.close()
-
-            if not tool:
-                logger.warning(f"工具未找到: {tool_name}", category=LogCategory.SYSTEM)
-                return None
-
-            logger.info(f"查找工具客户端: tool_id={tool.id}, clients字典内容: {list(self.clients.keys())}", category=LogCategory.SYSTEM)
-            client = self.clients.get(tool.id)
-            logger.info(f"获取到的客户端: {client}", category=LogCategory.SYSTEM)
-            return client
-
-        except Exception as e:
-            logger.error(f"获取工具客户端失败: {tool_name}, 错误: {e}", category=LogCategory.SYSTEM)
-            return None
+        return self.clients_by_name.get(tool_name)
+
+    def _lock_for(self, tool_id: int) -> asyncio.Lock:
+        """获取工具的启停锁，按最近使用顺序缓存"""
+        lock = self._locks.get(tool_id)
+        if lock is None:
+            lock = self._locks[tool_id] = asyncio.Lock()
+        self._locks.move_to_end(tool_id)
+
+        # 超出上限时淘汰空闲的旧锁（多为已删除的工具）
+        if len(self._locks) > MAX_TOOL_LOCKS:
+            for stale_id in list(self._locks)[:-1]:
+                if len(self._locks) <= MAX_TOOL_LOCKS:
+                    break
+                if not self._locks[stale_id].locked() and stale_id not in self._lock_owners:
+                    del self._locks[stale_id]
+        return lock
+
+    @asynccontextmanager
+    async def _tool_lock(self, tool_id: int):
+        """持有工具启停锁
+
+        同一任务内的嵌套调用（如 restart_tool 调用 stop_tool/start_tool）直接复用已持有的锁
+        """
+        task = asyncio.current_task()
+        if self._lock_owners.get(tool_id) is task:
+            yield
+            return
+
+        async with self._lock_for(tool_id):
+            self._lock_owners[tool_id] = task
+            try:
+                yield
+            finally:
+                self._lock_owners.pop(tool_id, None)
+
+    def _register_client(self, tool: MCPTool, client: MCPClient) -> None:
+        """登记工具的客户端，工具运行期间复用同一连接"""
+        self.clients[tool.id] = client
+        self.clients_by_name[tool.name] = client
+        self._client_names[tool.id] = tool.name
+
+    def _unregister_client(self, tool_id: int) -> Optional[MCPClient]:
+        """移除工具的客户端登记"""
+        client = self.clients.pop(tool_id, None)
+        name = self._client_names.pop(tool_id, None)
+        if name is not None and self.clients_by_name.get(name) is client:
+            del self.clients_by_name[name]
+        return client
+
+    async def _release_client(self, tool_id: int) -> None:
+        """移除工具客户端；HTTP 客户端只断开并保留会话，其余直接关闭"""
+        client = self._unregister_client(tool_id)
+        if client is None:
+            return
+        if client.connection_type == "server":
+            await client.disconnect(keep_session=True)
+            stale = self._parked_clients.pop(tool_id, None)
+            self._parked_clients[tool_id] = client
+            if stale is not None and stale is not client:
+                await stale.close()
+        else:
+            await client.close()
+
+    async def _close_parked_clients(self) -> None:
+        """关闭所有保留会话的客户端"""
+        clients = list(self._parked_clients.items())
+        self._parked_clients.clear()
+        results = await asyncio.gather(*(client.close() for _, client in clients), return_exceptions=True)
+        self._log_teardown_errors("关闭保留的客户端", [tool_id for tool_id, _ in clients], results)
 
     @error_handler
     async def shutdown(self) -> None:
@@ -833,23 +1053,30 @@ class MCPService(MCPBaseService):
 
             # 进程监控功能已移除
 
-            # 关闭所有客户端
-            for tool_id, client in list(self.clients.items()):
-                try:
-                    await client.close()
-                except Exception as e:
-                    logger.warning(f"关闭客户端失败 {tool_id}: {e}", category=LogCategory.SYSTEM)
+            # 并发关闭所有客户端
+            clients = list(self.clients.items())
+            results = await asyncio.gather(*(client.close() for _, client in clients), return_exceptions=True)
+            self._log_teardown_errors("关闭客户端", [tool_id for tool_id, _ in clients], results)
 
             self.clients.clear()
-
-            # 停止所有进程
-            for tool_id in list(self.processes.keys()):
-                try:
-                    await self._stop_process(tool_id, force=True)
-                except Exception as e:
-                    logger.warning(f"停止进程失败 {tool_id}: {e}", category=LogCategory.SYSTEM)
+            self.clients_by_name.clear()
+            self._client_names.clear()
+            await self._close_parked_clients()
+
+            # 并发停止所有进程
+            tool_ids = list(self.processes.keys())
+            results = await asyncio.gather(
+                *(self._stop_process(tool_id, force=True) for tool_id in tool_ids),
+                return_exceptions=True
+            )
+            self._log_teardown_errors("停止进程", tool_ids, results)
 
             self.processes.clear()
+            self.tool_statuses.clear()
+            await self._stop_health_task()
+            await self._stop_status_worker()
+            await self._stop_log_worker()
+            self._start_executor.shutdown(wait=False)
 
             logger.info("MCP 服务已关闭", category=LogCategory.SYSTEM)
 
@@ -857,31 +1084,34 @@ class MCPService(MCPBaseService):
             logger.error(f"关闭 MCP 服务失败: {e}", category=LogCategory.SYSTEM)
 
     # 私有方法
+    @staticmethod
+    def _build_base_env() -> Dict[str, str]:
+        """生成工具进程的基础环境变量"""
+        env = os.environ.copy()
+
+        # 添加编码相关的环境变量以解决中文乱码问题
+        if _IS_WINDOWS:
+            env.update({
+                'PYTHONIOENCODING': 'utf-8',
+                'PYTHONLEGACYWINDOWSSTDIO': '0',
+                'FORCE_COLOR': '0',  # 禁用颜色输出避免编码问题
+                'CHCP': '65001'  # 设置Windows代码页为UTF-8
+            })
+        else:
+            env.update({
+                'PYTHONIOENCODING': 'utf-8',
+                'LANG': 'zh_CN.UTF-8',
+                'LC_ALL': 'zh_CN.UTF-8',
+                'FORCE_COLOR': '0'  # 禁用颜色输出避免编码问题
+            })
+        return env
+
     @error_handler
     def _start_process_sync(self, tool: MCPTool) -> Optional[subprocess.Popen]:
-        """同步启动工具进程（在线程中运行）"""
+        """同步创建工具进程（在线程中运行），启动后的存活检查由 _start_process 在事件循环中完成"""
         try:
-            # 构建环境变量
-            env = os.environ.copy()
-
-            # 添加编码相关的环境变量以解决中文乱码问题
-            if platform.system() == "Windows":
-                env.update({
-                    'PYTHONIOENCODING': 'utf-8',
-                    'PYTHONLEGACYWINDOWSSTDIO': '0',
-                    'FORCE_COLOR': '0',  # 禁用颜色输出避免编码问题
-                    'CHCP': '65001'  # 设置Windows代码页为UTF-8
-                })
-            else:
-                env.update({
-                    'PYTHONIOENCODING': 'utf-8',
-                    'LANG': 'zh_CN.UTF-8',
-                    'LC_ALL': 'zh_CN.UTF-8',
-                    'FORCE_COLOR': '0'  # 禁用颜色输出避免编码问题
-                })
-
-            if tool.environment_variables:
-                env.update(tool.environment_variables)
+            # 构建环境变量，基础环境在服务初始化时已生成
+            env = {**self._base_env, **tool.environment_variables} if tool.environment_variables else self._base_env
 
             logger.info(f"启动工具进程: {tool.name}, 命令: {tool.command}", category=LogCategory.SYSTEM)
 
@@ -899,91 +1129,99 @@ class MCPService(MCPBaseService):
                 kwargs["cwd"] = tool.working_directory
 
             # Windows平台特殊处理
-            if platform.system() == "Windows":
-                # 在Windows上使用shell=True来执行命令，这样可以执行内置命令如echo
-                kwargs["shell"] = True
-                kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+            if _IS_WINDOWS:
                 kwargs["text"] = True
                 kwargs["encoding"] = 'utf-8'
                 kwargs["errors"] = 'strict'
-                process = subprocess.Popen(tool.command, **kwargs)
+                argv = _windows_direct_argv(tool.command)
+                if argv is None:
+                    # 内置命令（如echo）、批处理脚本或含管道重定向的命令仍通过 cmd.exe 执行
+                    kwargs["shell"] = True
+                    kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+                    process = subprocess.Popen(tool.command, **kwargs)
+                else:
+                    # 可执行文件直接启动，不经过 cmd.exe，终止信号可以直接到达工具进程
+                    kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.CREATE_NO_WINDOW
+                    process = subprocess.Popen(argv, **kwargs)
 
             else:
                 # 在非Windows平台上解析命令和参数
-                cmd_parts = shlex.split(tool.command)
+                # 不设置 preexec_fn/user/group，使 Popen 走 vfork 快速路径，不复制父进程页表
+                cmd_parts = list(_split_command(tool.command))
                 kwargs["start_new_session"] = True
                 kwargs["text"] = True
                 kwargs["encoding"] = 'utf-8'
                 kwargs["errors"] = 'strict'
                 process = subprocess.Popen(cmd_parts, **kwargs)
 
-            # 等待一小段时间确保进程启动
-            import time
-            time.sleep(0.1)
-
-            # 检查进程是否还在运行
-            if process.poll() is not None:
-                logger.error(f"进程启动后立即退出，退出码: {process.returncode}", category=LogCategory.SYSTEM)
-                return None
-
-            logger.info(f"工具进程启动成功: {tool.name}, PID: {process.pid}", category=LogCategory.SYSTEM)
             return process
 
         except Exception as e:
-            import traceback
-            error_details = f"启动进程失败: {e}\n命令: {tool.command}\n工作目录: {tool.working_directory or '未设置'}\n异常详情: {traceback.format_exc()}"
-            logger.error(error_details, category=LogCategory.SYSTEM)
+            # 异常堆栈由日志框架按需格式化，不在此处拼接
+            logger.error(
+                f"启动进程失败: {e}\n命令: {tool.command}\n工作目录: {tool.working_directory or '未设置'}",
+                exc_info=True,
+                category=LogCategory.SYSTEM
+            )
             return None
 
-    @error_handler
-    async def _start_process(self, tool: MCPTool) -> Optional[subprocess.Popen]:
-        """异步启动工具进程"""
-        loop = asyncio.get_event_loop()
-        with ThreadPoolExecutor() as executor:
-            return await loop.run_in_executor(executor, self._start_process_sync, tool)
-
-    @with_retry(RetryConfig(max_attempts=3, base_delay=1.0, exponential_base=2.0))
-    @error_handler
-    async def _start_process_with_retry(self, tool: MCPTool) -> Optional[subprocess.Popen]:
-        """带重试的启动工具进程"""
+    @mcp_endpoint(RetryConfig(max_attempts=3, base_delay=1.0, exponential_base=2.0), translate_errors=True)
+    async def _start_process(self, tool: MCPTool) -> subprocess.Popen:
+        """异步启动工具进程，失败时抛出 ProcessStartError 并重试；命令不存在时直接失败不重试"""
+        if not _IS_WINDOWS:
+            path = (tool.environment_variables or {}).get("PATH", self._base_env.get("PATH"))
+            cwd = tool.working_directory.strip() if tool.working_directory else None
+            missing = _find_missing_executable(tool.command, cwd, path)
+            if missing is not None:
+                raise ToolConfigError(f"找不到可执行文件: {missing}，命令: {tool.command}")
+
+        loop = asyncio.get_running_loop()
+        process = await loop.run_in_executor(self._start_executor, self._start_process_sync, tool)
+        if process is None:
+            raise ProcessStartError(f"进程启动失败: {tool.name}")
+        self._drain_stderr(tool.id, process)
+
+        # 等待一小段时间确保进程启动，进程提前退出时立即返回
         try:
-            process = await self._start_process(tool)
-            if not process:
-                raise ProcessStartError(f"进程启动失败: {tool.name}")
+            await self._wait_process(process, PROCESS_STARTUP_CHECK)
+        except subprocess.TimeoutExpired:
+            logger.info(f"工具进程启动成功: {tool.name}, PID: {process.pid}", category=LogCategory.SYSTEM)
             return process
-        except Exception as e:
-            logger.error(f"启动进程失败: {tool.name}, 错误: {e}", category=LogCategory.SYSTEM)
-            raise ProcessStartError(f"进程启动失败: {e}")
+
+        raise ProcessStartError(f"进程启动后立即退出: {tool.name}，退出码: {process.returncode}")
 
     @error_handler
-    async def _stop_process(self, tool_id: int, force: bool = False) -> bool:
-        """停止进程"""
+    async def _stop_process(self, tool_id: int, force: bool = False, grace: float = PROCESS_TERM_GRACE) -> bool:
+        """停止进程及其子进程，非强制时先 SIGTERM 并最多等待 grace 秒"""
         try:
+            # 主动停止不触发退出回调
+            self._unwatch_exit(tool_id)
             if tool_id not in self.processes:
                 return True
 
             process = self.processes[tool_id]
 
-            # 检查进程是否已结束
-            if process.returncode is not None:
+            # 检查进程是否已结束（如 stdio 客户端关闭时已结束），其进程组中可能仍有残留的子进程
+            if process.poll() is not None:
+                _signal_process_tree(process)
                 del self.processes[tool_id]
                 return True
 
             # 优雅关闭
             if not force:
                 try:
-                    process.terminate()
-                    await asyncio.wait_for(process.wait(), timeout=5.0)
+                    _signal_process_tree(process)
+                    await self._wait_process(process, timeout=grace)
                     del self.processes[tool_id]
                     return True
-                except asyncio.TimeoutError:
+                except subprocess.TimeoutExpired:
                     logger.warning(f"进程优雅关闭超时，强制终止: {process.pid}", category=LogCategory.SYSTEM)
 
             # 强制终止
             try:
-                process.kill()
-                await asyncio.wait_for(process.wait(), timeout=3.0)
-            except asyncio.TimeoutError:
+                _signal_process_tree(process, kill=True)
+                await self._wait_process(process, timeout=PROCESS_KILL_GRACE)
+            except subprocess.TimeoutExpired:
                 logger.error(f"强制终止进程超时: {process.pid}", category=LogCategory.SYSTEM)
                 return False
 
@@ -994,226 +1232,286 @@ class MCPService(MCPBaseService):
             logger.error(f"停止进程失败: {e}", category=LogCategory.SYSTEM)
             return False
 
-    @with_retry(RetryConfig(max_attempts=2, base_delay=0.5, exponential_base=1.5))
-    @error_handler
-    async def _stop_process_with_retry(self, tool_id: int, force: bool = False) -> bool:
-        """带重试的停止进程"""
-        try:
-            success = await self._stop_process(tool_id, force)
-            if not success:
-                raise ProcessStopError(f"进程停止失败: {tool_id}")
-            return success
-        except Exception as e:
-            logger.error(f"停止进程失败: {tool_id}, 错误: {e}", category=LogCategory.SYSTEM)
-            raise ProcessStopError(f"进程停止失败: {e}")
+    @staticmethod
+    async def _wait_process(process: subprocess.Popen, timeout: float) -> int:
+        """等待进程退出，超时抛出 subprocess.TimeoutExpired，不阻塞事件循环
 
-    @error_handler
-    async def _create_client(self, tool: MCPTool, process: subprocess.Popen) -> Optional[MCPClient]:
-        """创建 MCP 客户端"""
-        try:
-            if tool.connection_type == "stdio":
-                # STDIO 连接
-                client = MCPClient(
-                    connection_type="stdio",
-                    process=process
-                )
-            elif tool.connection_type in ["http", "websocket"]:
-                # 服务器连接
-                client = MCPClient(
-                    connection_type=tool.connection_type,
-                    host=tool.host or "localhost",
-                    port=tool.port or 8080
-                )
-            else:
-                logger.error(f"不支持的连接类型: {tool.connection_type}", category=LogCategory.SYSTEM)
-                return None
+        支持 pidfd/kqueue 的平台由事件循环在进程退出时直接唤醒，其他平台在线程中等待
+        """
+        if process.poll() is not None:
+            return process.returncode
 
-            # 连接客户端
-            success = await client.connect(timeout=tool.timeout or 30)
-            if not success:
-                logger.error(f"MCP 客户端连接失败: {tool.name}", category=LogCategory.SYSTEM)
-                return None
+        handle = _open_exit_handle(process.pid)
+        if handle is None:
+            return await asyncio.to_thread(process.wait, timeout)
 
-            return client
+        fd, close = handle
+        loop = asyncio.get_running_loop()
+        exited = loop.create_future()
+        loop.add_reader(fd, lambda: exited.done() or exited.set_result(None))
+        try:
+            await asyncio.wait_for(exited, timeout)
+        except asyncio.TimeoutError:
+            raise subprocess.TimeoutExpired(process.args, timeout)
+        finally:
+            loop.remove_reader(fd)
+            close()
+
+        # 进程已退出，wait 只负责回收并设置 returncode
+        return process.wait()
+
+    @mcp_endpoint(RetryConfig(max_attempts=3, base_delay=1.0, exponential_base=2.0), translate_errors=True)
+    async def _create_client(self, tool: MCPTool, process: subprocess.Popen) -> MCPClient:
+        """创建并连接 MCP 客户端，连接失败时抛出 MCPConnectionError 并重试"""
+        if tool.connection_type == "stdio":
+            # STDIO 连接
+            client = MCPClient(
+                connection_type="stdio",
+                process=process
+            )
+        elif tool.connection_type in ["http", "websocket"]:
+            # 服务器连接；MCPClient 中 HTTP 模式名为 "server"
+            connection_type = "server" if tool.connection_type == "http" else tool.connection_type
+            host = tool.host or "localhost"
+            port = tool.port or 8080
+            client = self._parked_clients.pop(tool.id, None)
+            if client is not None and (client.connection_type, client.host, client.port) == (connection_type, host, port):
+                # 重启时复用上次保留的会话
+                if not await client.reconnect(timeout=tool.timeout or 30):
+                    await client.close()
+                    raise MCPConnectionError(f"MCP 客户端连接失败: {tool.name}")
+                return client
+            if client is not None:
+                await client.close()
+            client = MCPClient(
+                connection_type=connection_type,
+                host=host,
+                port=port
+            )
+        else:
+            raise ToolConfigError(f"不支持的连接类型: {tool.connection_type}")
 
-        except Exception as e:
-            logger.error(f"创建 MCP 客户端失败: {e}", category=LogCategory.SYSTEM)
-            return None
+        # 连接客户端
+        if not await client.connect(timeout=tool.timeout or 30):
+            raise MCPConnectionError(f"MCP 客户端连接失败: {tool.name}")
 
-    @with_retry(RetryConfig(max_attempts=3, base_delay=1.0, exponential_base=2.0))
-    @error_handler
-    async def _create_client_with_retry(self, tool: MCPTool, process: subprocess.Popen) -> Optional[MCPClient]:
-        """带重试的创建 MCP 客户端"""
-        try:
-            client = await self._create_client(tool, process)
-            if not client:
-                raise MCPConnectionError(f"MCP 客户端创建失败: {tool.name}")
-            return client
-        except Exception as e:
-            logger.error(f"创建 MCP 客户端失败: {tool.name}, 错误: {e}", category=LogCategory.SYSTEM)
-            raise MCPConnectionError(f"MCP 客户端创建失败: {e}")
+        return client
 
     @error_handler
     async def _cleanup_process(self, tool_id: int) -> None:
         """清理进程"""
+        self._unwatch_exit(tool_id)
+        self.tool_statuses.pop(tool_id, None)
         if tool_id in self.processes:
             del self.processes[tool_id]
 
-        if tool_id in self.clients:
+        try:
+            await self._release_client(tool_id)
+        except Exception:
+            pass
+
+    @error_handler
+    async def _cleanup_tool(self, tool_id: int, error_message: Optional[str] = None) -> None:
+        """清理工具资源，error_message 记录为工具的最后错误"""
+        async with self._tool_lock(tool_id):
+            await self._cleanup_process(tool_id)
+
+            # 更新数据库状态
+            self._enqueue_status(tool_id, ToolStatus.ERROR, error_message=error_message)
+
+            await self._invalidate_tool_lists()
+
+    async def _invalidate_tool_lists(self) -> None:
+        """工具状态变化后清除工具列表缓存"""
+        await _tool_list_cache.delete_many([_AVAILABLE_TOOLS_KEY, _AVAILABLE_TOOLS_WITH_CAPS_KEY])
+
+    def _watch_health(self, tool_id: int) -> None:
+        """将工具加入健康检查"""
+        self._health_tool_ids.add(tool_id)
+        self._ensure_health_task()
+
+    def _ensure_health_task(self) -> None:
+        """健康检查任务未运行时启动"""
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_check_loop())
+
+    async def _stop_health_task(self) -> None:
+        """停止健康检查任务"""
+        self._health_tool_ids.clear()
+        if self._health_task is None:
+            return
+        if not self._health_task.done():
+            self._health_task.cancel()
             try:
-                await self.clients[tool_id].close()
-            except Exception:
+                await self._health_task
+            except asyncio.CancelledError:
                 pass
-            del self.clients[tool_id]
+        self._health_task = None
 
     @error_handler
-    async def _cleanup_tool(self, tool_id: int) -> None:
-        """清理工具资源"""
-        await self._cleanup_process(tool_id)
+    async def _health_check_loop(self) -> None:
+        """健康检查循环，按固定间隔依次检查所有运行中的工具"""
+        while not self._shutdown_event.is_set():
+            tool_ids = list(self._health_tool_ids)
+            if tool_ids:
+                try:
+                    # 每轮只在线程中查询一次数据库，会话关闭后再探测连接；状态变化交给后台任务批量写入
+                    tools = await self._run_db(
+                        lambda tool_service: {tool.id: tool for tool in tool_service.get_tools_by_ids(tool_ids)}
+                    )
+                    for tool_id in tool_ids:
+                        try:
+                            if not await self._check_tool_health(tool_id, tools.get(tool_id)):
+                                self._health_tool_ids.discard(tool_id)
+                        except Exception as e:
+                            logger.error(f"健康检查失败 {tool_id}: {e}", category=LogCategory.SYSTEM)
+                except Exception as e:
+                    logger.error(f"健康检查失败: {e}", category=LogCategory.SYSTEM)
 
-        # 更新数据库状态
-        try:
-            from app.services.tools import ToolService
-            from app.core.database import get_db
+            # 等待下次检查，服务关闭时立即退出
+            try:
+                await asyncio.wait_for(self._shutdown_event.wait(), timeout=HEALTH_CHECK_INTERVAL)
+                break
+            except asyncio.TimeoutError:
+                pass
 
-            db = next(get_db())
-            tool_service = ToolService(db)
-            tool_service.update_tool_status(tool_id, ToolStatus.ERROR)
-            db.close()
-        except Exception as e:
-            logger.error(f"更新工具状态失败: {e}", category=LogCategory.SYSTEM)
+    async def _check_tool_health(self, tool_id: int, tool: Optional[MCPTool]) -> bool:
+        """检查单个工具的进程和连接状态，返回是否需要继续检查"""
+        if not tool or tool.status != ToolStatus.RUNNING:
+            return False
 
-    @error_handler
-    async def _health_check_loop(self, tool_id: int) -> None:
-        """健康检查循环"""
+        # 检查进程状态
+        if tool_id not in self.processes:
+            self._enqueue_status(tool_id, ToolStatus.STOPPED)
+            return False
+
+        # 已通过 pidfd 监听退出的进程无需轮询
+        process = self.processes[tool_id]
+        if tool_id not in self._exit_watchers and process.poll() is not None:
+            # 进程已结束
+            await self._cleanup_process(tool_id)
+            self._handle_unexpected_exit(tool, process.returncode)
+            return False
+
+        # 检查 MCP 连接
+        if tool_id in self.clients:
+            client = self.clients[tool_id]
+            if not await client.is_connected():
+                logger.warning(f"MCP 连接断开: {tool.name}", category=LogCategory.SYSTEM)
+                self._set_tool_state(tool_id, ToolStatus.ERROR)
+                self._enqueue_status(tool_id, ToolStatus.ERROR, "MCP 连接断开")
+                return False
+
+        return True
+
+    def _handle_unexpected_exit(self, tool: MCPTool, exit_code: Optional[int]) -> None:
+        """处理工具进程意外退出：按配置自动重启或记录错误状态"""
+        tool_id = tool.id
+        if tool.restart_on_failure and tool.restart_count < tool.max_restart_attempts:
+            logger.info(f"工具异常退出（退出码: {exit_code}），自动重启: {tool.name}", category=LogCategory.SYSTEM)
+            try:
+                asyncio.create_task(self.restart_tool(tool_id))
+            except Exception as restart_error:
+                logger.error(f"自动重启失败: {restart_error}", category=LogCategory.SYSTEM)
+                self._enqueue_status(tool_id, ToolStatus.ERROR, f"进程异常退出且重启失败: {restart_error}")
+        else:
+            error_msg = f"进程异常退出（退出码: {exit_code}）"
+            if tool.restart_count >= tool.max_restart_attempts:
+                error_msg += f"，重启次数已达上限 ({tool.max_restart_attempts})"
+            self._enqueue_status(tool_id, ToolStatus.ERROR, error_msg)
+
+    def _watch_exit(self, tool_id: int, process: subprocess.Popen) -> None:
+        """通过 pidfd/kqueue 监听进程退出，不支持时由健康检查轮询兜底"""
+        handle = _open_exit_handle(process.pid)
+        if handle is None:
+            return
+
+        self._unwatch_exit(tool_id)
+        asyncio.get_running_loop().add_reader(handle[0], self._on_process_exit, tool_id, process)
+        self._exit_watchers[tool_id] = handle
+
+    def _unwatch_exit(self, tool_id: int) -> None:
+        """取消进程退出监听"""
+        handle = self._exit_watchers.pop(tool_id, None)
+        if handle is None:
+            return
+        fd, close = handle
         try:
-            from app.services.tools import ToolService
-            from app.core.database import get_db
+            asyncio.get_running_loop().remove_reader(fd)
+        finally:
+            close()
 
-            while not self._shutdown_event.is_set():
-                try:
-                    # 获取工具信息
-                    db = next(get_db())
-                    tool_service = ToolService(db)
-                    tool = tool_service.get_tool(tool_id)
-
-                    if not tool or tool.status != ToolStatus.RUNNING:
-                        break
-
-                    # 检查进程状态
-                    if tool_id not in self.processes:
-                        tool_service.update_tool_status(tool_id, ToolStatus.STOPPED)
-                        break
-
-                    process = self.processes[tool_id]
-                    if process.poll() is not None:
-                        # 进程已结束
-                        exit_code = process.returncode
-                        await self._cleanup_process(tool_id)
-
-                        # 检查是否需要自动重启
-                        if tool.restart_on_failure and tool.restart_count < tool.max_restart_attempts:
-                            logger.info(f"工具异常退出（退出码: {exit_code}），自动重启: {tool.name}", category=LogCategory.SYSTEM)
-                            try:
-                                asyncio.create_task(self.restart_tool(tool_id))
-                            except Exception as restart_error:
-                                logger.error(f"自动重启失败: {restart_error}", category=LogCategory.SYSTEM)
-                                tool_service.update_tool_status(
-                                    tool_id,
-                                    ToolStatus.ERROR,
-                                    error_message=f"进程异常退出且重启失败: {restart_error}"
-                                )
-                        else:
-                            error_msg = f"进程异常退出（退出码: {exit_code}）"
-                            if tool.restart_count >= tool.max_restart_attempts:
-                                error_msg += f"，重启次数已达上限 ({tool.max_restart_attempts})"
-                            tool_service.update_tool_status(
-                                tool_id,
-                                ToolStatus.ERROR,
-                                error_message=error_msg
-                            )
-                        break
-
-                    # 检查 MCP 连接
-                    if tool_id in self.clients:
-                        client = self.clients[tool_id]
-                        if not await client.is_connected():
-                            logger.warning(f"MCP 连接断开: {tool.name}", category=LogCategory.SYSTEM)
-                            tool_service.update_tool_status(
-                                tool_id,
-                                ToolStatus.ERROR,
-                                error_message="MCP 连接断开"
-                            )
-                            break
-
-                    db.close()
-
-                    # 等待下次检查
-                    await asyncio.sleep(30)  # 固定30秒检查间隔
+    def _on_process_exit(self, tool_id: int, process: subprocess.Popen) -> None:
+        """退出句柄可读回调：进程已退出"""
+        self._unwatch_exit(tool_id)
+        asyncio.create_task(self._handle_process_exit(tool_id, process))
 
-                except Exception as e:
-                    logger.error(f"健康检查失败 {tool_id}: {e}", category=LogCategory.SYSTEM)
-                    await asyncio.sleep(30)
+    @error_handler
+    async def _handle_process_exit(self, tool_id: int, process: subprocess.Popen) -> None:
+        """处理监听到的进程退出
 
-        except Exception as e:
-            logger.error(f"健康检查循环异常 {tool_id}: {e}", category=LogCategory.SYSTEM)
+        主动停止或重启时进程已从 processes 中移除或被替换，此处忽略
+        """
+        async with self._tool_lock(tool_id):
+            if self.processes.get(tool_id) is not process:
+                return
+            exit_code = process.poll()
+            await self._cleanup_process(tool_id)
+            self._health_tool_ids.discard(tool_id)
+
+            tool = await self._run_db(lambda tool_service: tool_service.get_tool(tool_id))
+            if tool:
+                self._handle_unexpected_exit(tool, exit_code)
 
     @error_handler
     async def _auto_start_tools(self) -> None:
         """自动启动设置了auto_start=true的工具"""
         try:
-            from app.services.tools import ToolService
-            from app.core.database import get_db
-
             logger.info("开始自动启动工具...", category=LogCategory.SYSTEM)
 
-            db = next(get_db())
-            tool_service = ToolService(db)
-
             # 查找所有设置了auto_start=true且启用的工具
-            filters = {
-                'enabled': True
-            }
-            tools, _ = tool_service.get_tools(filters=filters)
-
-            auto_start_tools = [tool for tool in tools if getattr(tool, 'auto_start', False)]
+            auto_start_tools = await self._run_db(self._load_auto_start_tools)
 
             if not auto_start_tools:
                 logger.info("没有找到需要自动启动的工具", category=LogCategory.SYSTEM)
-                db.close()
                 return
 
             logger.info(f"找到 {len(auto_start_tools)} 个需要自动启动的工具", category=LogCategory.SYSTEM)
 
-            # 并发启动所有auto_start工具
-            start_tasks = []
-            for tool in auto_start_tools:
-                logger.info(f"准备自动启动工具: {tool.name} (ID: {tool.id})", category=LogCategory.SYSTEM)
-                task = asyncio.create_task(self._auto_start_single_tool(tool.id, tool.name))
-                start_tasks.append(task)
-
-            # 等待所有启动任务完成
-            if start_tasks:
-                results = await asyncio.gather(*start_tasks, return_exceptions=True)
-
-                success_count = 0
-                for i, result in enumerate(results):
-                    tool = auto_start_tools[i]
-                    if isinstance(result, Exception):
-                        logger.error(f"自动启动工具失败: {tool.name}, 错误: {result}", category=LogCategory.SYSTEM)
-                    elif result:
-                        success_count += 1
-                        logger.info(f"自动启动工具成功: {tool.name}", category=LogCategory.SYSTEM)
-                    else:
-                        logger.warning(f"自动启动工具失败: {tool.name}", category=LogCategory.SYSTEM)
+            # 限制并发数启动所有auto_start工具，按完成顺序逐个处理结果
+            semaphore = asyncio.Semaphore(AUTO_START_CONCURRENCY)
 
-                logger.info(f"自动启动完成: 成功 {success_count}/{len(auto_start_tools)} 个工具", category=LogCategory.SYSTEM)
+            async def start_one(tool_id: int, tool_name: str) -> Tuple[str, Any]:
+                async with semaphore:
+                    try:
+                        return tool_name, await self._auto_start_single_tool(tool_id, tool_name)
+                    except Exception as e:
+                        return tool_name, e
+
+            success_count = 0
+            for next_done in asyncio.as_completed([
+                start_one(tool_id, tool_name) for tool_id, tool_name in auto_start_tools
+            ]):
+                tool_name, result = await next_done
+                if isinstance(result, Exception):
+                    logger.error(f"自动启动工具失败: {tool_name}, 错误: {result}", category=LogCategory.SYSTEM)
+                elif result:
+                    success_count += 1
+                    logger.info(f"自动启动工具成功: {tool_name}", category=LogCategory.SYSTEM)
+                else:
+                    logger.warning(f"自动启动工具失败: {tool_name}", category=LogCategory.SYSTEM)
 
-            db.close()
+            logger.info(f"自动启动完成: 成功 {success_count}/{len(auto_start_tools)} 个工具", category=LogCategory.SYSTEM)
 
         except Exception as e:
             logger.error(f"自动启动工具失败: {e}", category=LogCategory.SYSTEM)
 
+    @staticmethod
+    def _load_auto_start_tools(tool_service: Any) -> List[Tuple[int, str]]:
+        """查询需要自动启动的工具（在线程中执行），返回 (id, name) 列表"""
+        tools, _ = tool_service.get_tools(filters={'enabled': True})
+        return [(tool.id, tool.name) for tool in tools if getattr(tool, 'auto_start', False)]
+
     @error_handler
     async def _auto_start_single_tool(self, tool_id: int, tool_name: str) -> bool:
         """自动启动单个工具"""
@@ -1226,3 +1524,7 @@ class MCPService(MCPBaseService):
 
 # 全局 MCP 服务实例
 mcp_service = MCPService()
+
+def get_mcp_service() -> MCPService:
+    """获取全局 MCP 服务实例"""
+    return mcp_service
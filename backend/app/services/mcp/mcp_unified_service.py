@@ -9,16 +9,18 @@
 """
 
 import asyncio
-import subprocess
-from typing import Dict, Any, Optional, List
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple
 from enum import Enum
 from dataclasses import dataclass
 from contextlib import asynccontextmanager
 
-from app.core import (
-    get_unified_config_manager, get_logger, error_handler,
-    MCPSError, LogLevel, LogCategory
-)
+import psutil
+
+from app.core import get_unified_config_manager, get_logger, error_handler
 from .mcp_service import MCPService
 from .mcp_server import MCPSServer
 from .mcp_proxy_server import MCPProxyServer
@@ -27,6 +29,17 @@ from app.utils.exceptions import MCPServiceError
 
 logger = get_logger(__name__)
 
+# 代理工具列表在统一服务内的缓存时间（秒），合并状态、指标和工具列表接口的同批轮询
+PROXY_TOOLS_CACHE_TTL = 1.0
+
+async def _gather_all(*aws) -> List[Any]:
+    """并发执行多个互不依赖的操作，全部结束后若有失败则抛出第一个异常"""
+    results = await asyncio.gather(*aws, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
 class ServiceMode(Enum):
     """服务模式枚举"""
     PROXY_ONLY = "proxy"
@@ -62,6 +75,13 @@ class MCPUnifiedService(BaseService):
         self._start_time: Optional[float] = None
         self._lock = asyncio.Lock()
 
+        self._tools_cache: Optional[Tuple[float, List[Dict[str, Any]]]] = None  # (获取时间, 代理工具列表)
+        self._tools_cache_lock = asyncio.Lock()
+
+        # 复用同一个进程对象，cpu_percent 才能按两次调用间隔计算占用率；首次调用只建立基准
+        self._process = psutil.Process(os.getpid())
+        self._process.cpu_percent(interval=None)
+
     @property
     def mode(self) -> ServiceMode:
         """当前服务模式"""
@@ -91,10 +111,10 @@ class MCPUnifiedService(BaseService):
 
         # 初始化代理服务
         if self._mode == ServiceMode.PROXY_ONLY:
+            # 代理服务与代理服务器各自持有 MCPService 实例，互不依赖，并发初始化
             self._proxy_service = MCPService()
-            await self._proxy_service.initialize()
             self._proxy_server = MCPProxyServer()
-            await self._proxy_server.initialize()
+            await _gather_all(self._proxy_service.initialize(), self._proxy_server.initialize())
             self.logger.info("MCP代理服务已初始化")
 
         # 初始化服务端
@@ -104,58 +124,73 @@ class MCPUnifiedService(BaseService):
 
     async def _start_impl(self) -> None:
         """具体的启动实现"""
-        self.logger.info(f"启动MCP统一服务，模式: {self._mode.value}")
+        await self._do_start(self._mode)
+
+    async def _stop_impl(self) -> None:
+        """具体的停止实现"""
+        await self._do_stop()
+        self._start_time = None
+
+    async def _do_start(self, mode: ServiceMode) -> None:
+        """按模式启动子服务并记录启动时间"""
+        logger.info(f"启动MCP统一服务，模式: {mode.value}")
 
         # 启动代理服务
-        if self._mode == ServiceMode.PROXY_ONLY:
+        if mode == ServiceMode.PROXY_ONLY:
             if self._proxy_service and self._proxy_server:
-                await self._proxy_service.start()
-                await self._proxy_server.start()
-                self.logger.info("MCP代理服务已启动")
+                services = [self._proxy_service, self._proxy_server]
+                results = await asyncio.gather(*(service.start() for service in services), return_exceptions=True)
+                errors = [result for result in results if isinstance(result, BaseException)]
+                if errors:
+                    # 一方启动失败时停止已启动的一方
+                    await asyncio.gather(
+                        *(service.stop() for service, result in zip(services, results)
+                          if not isinstance(result, BaseException)),
+                        return_exceptions=True
+                    )
+                    raise errors[0]
+                logger.info("MCP代理服务已启动")
             else:
                 raise MCPServiceError("MCP代理服务未初始化")
 
         # 启动服务端
-        if self._mode == ServiceMode.SERVER_ONLY:
+        if mode == ServiceMode.SERVER_ONLY:
             if self._server_service:
                 await self._start_mcp_server()
-                self.logger.info("MCP服务端已启动")
+                logger.info("MCP服务端已启动")
             else:
                 raise MCPServiceError("MCP服务端未初始化")
 
         self._start_time = asyncio.get_event_loop().time()
 
-    async def _stop_impl(self) -> None:
-        """具体的停止实现"""
+    async def _do_stop(self, mode: Optional[ServiceMode] = None) -> None:
+        """按模式并发停止子服务，mode 为 None 时停止所有已创建的子服务"""
+        stops = []
+
         # 停止代理服务
-        if self._proxy_service:
-            await self._proxy_service.stop()
-        if self._proxy_server:
-            await self._proxy_server.stop()
+        if mode is None or mode == ServiceMode.PROXY_ONLY:
+            if self._proxy_service:
+                stops.append(self._proxy_service.stop())
+            if self._proxy_server:
+                stops.append(self._proxy_server.stop())
 
         # 停止服务端
-        if self._server_service:
-            await self._stop_mcp_server()
-        
-        # 停止API服务器
-
+        if (mode is None or mode == ServiceMode.SERVER_ONLY) and self._server_service:
+            stops.append(self._stop_mcp_server())
 
-        self._start_time = None
+        await _gather_all(*stops)
+        if mode is not None:
+            logger.info(f"MCP{'代理服务' if mode == ServiceMode.PROXY_ONLY else '服务端'}已停止")
 
     async def _cleanup_impl(self) -> None:
         """具体的清理实现"""
-        # 清理代理服务
+        # 清理代理服务；MCPProxyServer 不是 BaseService，没有清理方法，由 stop 释放资源
         if self._proxy_service:
-            if hasattr(self._proxy_service, 'cleanup'):
-                await self._proxy_service.cleanup()
-        if self._proxy_server:
-            if hasattr(self._proxy_server, 'cleanup'):
-                await self._proxy_server.cleanup()
+            await self._proxy_service.cleanup()
 
         # 清理服务端
         if self._server_service:
-            if hasattr(self._server_service, 'cleanup'):
-                await self._server_service.cleanup()
+            await self._server_service.cleanup()
 
     @error_handler
     async def start_service(self, mode: Optional[str] = None) -> None:
@@ -164,13 +199,18 @@ class MCPUnifiedService(BaseService):
         Args:
             mode: 可选的服务模式覆盖 ("proxy", "server")
         """
+        # 已在运行时无需获取锁，拿到锁后再检查一次
+        if self._running:
+            logger.warning("服务已在运行中")
+            return
+
         async with self._lock:
             if self._running:
                 logger.warning("服务已在运行中")
                 return
 
             # 确保服务已初始化
-            if not hasattr(self, '_initialized') or not self._initialized:
+            if not self.is_initialized:
                 logger.info("服务未初始化，正在初始化...")
                 await self.initialize()
 
@@ -183,29 +223,8 @@ class MCPUnifiedService(BaseService):
                     raise MCPServiceError(f"无效的服务模式: {mode}")
 
             try:
-                logger.info(f"启动MCP统一服务，模式: {self._mode.value}")
-
-                # 启动代理服务
-                if self._mode == ServiceMode.PROXY_ONLY:
-                    if self._proxy_service and self._proxy_server:
-                        await self._proxy_service.start()
-                        await self._proxy_server.start()
-                        logger.info("MCP代理服务已启动")
-                    else:
-                        raise MCPServiceError("MCP代理服务未初始化")
-
-                # 启动服务端
-                if self._mode == ServiceMode.SERVER_ONLY:
-                    if self._server_service:
-                        await self._start_mcp_server()
-                        logger.info("MCP服务端已启动")
-                    else:
-                        raise MCPServiceError("MCP服务端未初始化")
-                
-
-
+                await self._do_start(self._mode)
                 self._running = True
-                self._start_time = asyncio.get_event_loop().time()
                 logger.info("MCP统一服务启动完成")
 
             except Exception as e:
@@ -223,6 +242,11 @@ class MCPUnifiedService(BaseService):
         Args:
             mode: 可选的服务模式，指定要停止的服务 ("proxy", "server")
         """
+        # 未运行时无需获取锁，拿到锁后再检查一次
+        if not self._running:
+            logger.warning("服务未在运行")
+            return
+
         async with self._lock:
             if not self._running:
                 logger.warning("服务未在运行")
@@ -234,25 +258,12 @@ class MCPUnifiedService(BaseService):
             logger.info(f"停止MCP统一服务，模式: {stop_mode.value}")
 
             try:
-                # 停止代理服务
-                if stop_mode == ServiceMode.PROXY_ONLY:
-                    if self._proxy_service:
-                        await self._proxy_service.stop()
-                    if self._proxy_server:
-                        await self._proxy_server.stop()
-                    logger.info("MCP代理服务已停止")
-
-                # 停止服务端
-                if stop_mode == ServiceMode.SERVER_ONLY:
-                    if self._server_service:
-                        await self._stop_mcp_server()
-                        logger.info("MCP服务端已停止")
-
-
+                await self._do_stop(stop_mode)
 
                 # 更新运行状态
                 self._running = False
                 self._start_time = None
+                self._invalidate_tools_cache()
 
                 logger.info("MCP统一服务停止完成")
 
@@ -268,16 +279,21 @@ class MCPUnifiedService(BaseService):
             enable_server: 是否启用MCP服务端
             enable_proxy: 是否启用HTTP代理
         """
-        async with self._lock:
-            # 确定新模式
-            if enable_server:
-                new_mode = ServiceMode.SERVER_ONLY
-            elif enable_proxy:
-                new_mode = ServiceMode.PROXY_ONLY
-            else:
-                # 默认使用服务端模式
-                new_mode = ServiceMode.SERVER_ONLY
+        # 确定新模式
+        if enable_server:
+            new_mode = ServiceMode.SERVER_ONLY
+        elif enable_proxy:
+            new_mode = ServiceMode.PROXY_ONLY
+        else:
+            # 默认使用服务端模式
+            new_mode = ServiceMode.SERVER_ONLY
 
+        # 模式未变化时无需获取锁，拿到锁后再检查一次
+        if new_mode == self._mode:
+            logger.info(f"服务模式已经是 {new_mode.value}，无需切换")
+            return
+
+        async with self._lock:
             if new_mode == self._mode:
                 logger.info(f"服务模式已经是 {new_mode.value}，无需切换")
                 return
@@ -285,44 +301,63 @@ class MCPUnifiedService(BaseService):
             logger.info(f"切换服务模式: {self._mode.value} -> {new_mode.value}")
 
             was_running = self._running
+            old_mode = self._mode
 
             try:
-                # 停止当前服务
+                # 停止当前服务；已持有锁，直接停止子服务而不是调用 stop_service
                 if was_running:
-                    await self.stop_service()
+                    await self._do_stop(old_mode)
+                    self._running = False
+                    self._start_time = None
 
                 # 更新模式
-                old_mode = self._mode
                 self._mode = new_mode
+                self._invalidate_tools_cache()
 
                 # 重新初始化需要的服务
                 await self._reinitialize_services(old_mode, new_mode)
 
                 # 如果之前在运行，重新启动
                 if was_running:
-                    await self.start_service()
+                    await self._do_start(new_mode)
+                    self._running = True
 
                 logger.info(f"服务模式切换完成: {new_mode.value}")
 
             except Exception as e:
                 logger.error(f"切换服务模式失败: {e}")
+                await self._rollback_mode(old_mode, new_mode, was_running)
                 raise MCPServiceError(f"切换服务模式失败: {e}")
 
+    async def _rollback_mode(self, old_mode: ServiceMode, new_mode: ServiceMode, was_running: bool) -> None:
+        """切换失败时恢复原模式，原来在运行的重新启动原模式的服务"""
+        try:
+            if self._mode != old_mode:
+                self._mode = old_mode
+                self._invalidate_tools_cache()
+                await self._reinitialize_services(new_mode, old_mode)
+
+            if was_running and not self._running:
+                await self._do_start(old_mode)
+                self._running = True
+
+            logger.info(f"已恢复服务模式: {old_mode.value}")
+        except Exception as e:
+            logger.error(f"恢复服务模式 {old_mode.value} 失败: {e}")
+
     async def get_service_status(self) -> ServiceStatus:
         """获取服务状态"""
-        from datetime import datetime
-
         status = ServiceStatus(mode=self._mode)
 
         # 代理服务状态
         if self._proxy_service:
             status.proxy_running = self._proxy_service.is_running
-            proxy_tools = await self._proxy_service.get_available_tools()
+            proxy_tools = await self._cached_proxy_tools()
             status.proxy_tools_count = len(proxy_tools)
 
         # 服务端状态
         if self._server_service:
-            status.server_running = hasattr(self._server_service, '_running') and self._server_service._running
+            status.server_running = self._server_service.is_running
             # TODO: 实现客户端连接数统计
             status.server_connections = 0
 
@@ -342,6 +377,7 @@ class MCPUnifiedService(BaseService):
     async def reload_configuration(self) -> None:
         """重新加载配置"""
         logger.info("重新加载MCP服务配置")
+        self._invalidate_tools_cache()
 
         try:
             # 重新加载设置
@@ -367,7 +403,7 @@ class MCPUnifiedService(BaseService):
         tools = []
 
         if self._proxy_service:
-            proxy_tools = await self._proxy_service.get_available_tools()
+            proxy_tools = await self._cached_proxy_tools()
             for tool in proxy_tools:
                 tools.append({
                     **tool,
@@ -381,6 +417,25 @@ class MCPUnifiedService(BaseService):
 
         return tools
 
+    async def _cached_proxy_tools(self) -> List[Dict[str, Any]]:
+        """获取代理服务的工具列表，缓存时间内的调用复用同一结果，缓存过期时只有一个调用去获取"""
+        loop = asyncio.get_running_loop()
+        cached = self._tools_cache
+        if cached and loop.time() - cached[0] < PROXY_TOOLS_CACHE_TTL:
+            return cached[1]
+
+        async with self._tools_cache_lock:
+            cached = self._tools_cache
+            if cached and loop.time() - cached[0] < PROXY_TOOLS_CACHE_TTL:
+                return cached[1]
+            tools = await self._proxy_service.get_available_tools()
+            self._tools_cache = (loop.time(), tools)
+            return tools
+
+    def _invalidate_tools_cache(self) -> None:
+        """清除代理工具列表缓存"""
+        self._tools_cache = None
+
     @error_handler
     async def call_tool(self, tool_name: str, arguments: Dict[str, Any],
                        source: str = "auto") -> Dict[str, Any]:
@@ -429,16 +484,13 @@ class MCPUnifiedService(BaseService):
             port = config_manager.get("mcp.server.port", 8001)
             logger.info(f"启动MCP服务端HTTP服务器: {host}:{port}")
             # 在后台任务中启动HTTP服务器
-            asyncio.create_task(self._run_http_server())
+            asyncio.create_task(self._run_http_server(host, port))
 
     async def _run_stdio_server(self) -> None:
         """运行stdio服务器"""
         try:
             logger.info("启动stdio服务器")
             # 在独立线程中运行stdio服务器，避免阻塞FastAPI应用
-            import threading
-            import asyncio
-            
             def run_in_thread():
                 # 创建新的事件循环
                 loop = asyncio.new_event_loop()
@@ -458,17 +510,10 @@ class MCPUnifiedService(BaseService):
         except Exception as e:
             logger.error(f"stdio服务器启动失败: {e}")
 
-    async def _run_http_server(self) -> None:
-        """运行HTTP服务器"""
+    async def _run_http_server(self, host: str, port: int) -> None:
+        """运行HTTP服务器，监听地址由 _start_mcp_server 读取配置后传入"""
         try:
-            config_manager = get_unified_config_manager()
-            host = config_manager.get("mcp.server.host", "127.0.0.1")
-            port = config_manager.get("mcp.server.port", 8001)
-            
             # 在独立线程中运行HTTP服务器，避免阻塞FastAPI应用
-            import threading
-            import asyncio
-            
             def run_in_thread():
                 # 创建新的事件循环
                 loop = asyncio.new_event_loop()
@@ -535,9 +580,8 @@ class MCPUnifiedService(BaseService):
         # 初始化新需要的服务
         if new_mode == ServiceMode.PROXY_ONLY and not self._proxy_service:
             self._proxy_service = MCPService()
-            await self._proxy_service.initialize()
             self._proxy_server = MCPProxyServer()
-            await self._proxy_server.initialize()
+            await _gather_all(self._proxy_service.initialize(), self._proxy_server.initialize())
 
         if new_mode == ServiceMode.SERVER_ONLY and not self._server_service:
             self._server_service = MCPSServer()
@@ -545,14 +589,9 @@ class MCPUnifiedService(BaseService):
 
     async def get_service_metrics(self) -> Dict[str, Any]:
         """获取服务指标"""
-        import time
-        import psutil
-        import os
-
         try:
             # 获取系统指标
-            process = psutil.Process(os.getpid())
-            memory_info = process.memory_info()
+            memory_info = self._process.memory_info()
 
             # 基础指标
             metrics = {
@@ -563,13 +602,13 @@ class MCPUnifiedService(BaseService):
                 "average_response_time": 0.0,
                 "active_connections": 0,
                 "memory_usage": memory_info.rss / 1024 / 1024,  # MB
-                "cpu_usage": process.cpu_percent()
+                "cpu_usage": self._process.cpu_percent(interval=None)
             }
 
             # 代理服务指标
             if self._proxy_service:
                 # TODO: 从代理服务获取真实指标
-                proxy_tools = await self._proxy_service.get_available_tools()
+                proxy_tools = await self._cached_proxy_tools()
                 proxy_metrics = {
                     "proxy_tools_count": len(proxy_tools),
                     "proxy_running": self._proxy_service.is_running
@@ -580,7 +619,7 @@ class MCPUnifiedService(BaseService):
             if self._server_service:
                 # TODO: 从服务端获取真实指标
                 server_metrics = {
-                    "server_running": hasattr(self._server_service, '_running') and self._server_service._running,
+                    "server_running": self._server_service.is_running,
                     "server_connections": 0  # TODO: 实现连接数统计
                 }
                 metrics.update(server_metrics)
@@ -622,10 +661,10 @@ class MCPUnifiedService(BaseService):
                 if self._server_service:
                     logger.info("使用MCP服务端stdio模式")
                     # 确保服务端已初始化
-                    if not self._server_service._initialized:
+                    if not self._server_service.is_initialized:
                         await self._server_service.initialize()
                     # 确保服务端已启动
-                    if not self._server_service._running:
+                    if not self._server_service.is_running:
                         await self._server_service.start()
                     # 使用异步方法运行stdio
                     logger.info("调用异步stdio方法...")
@@ -650,18 +689,14 @@ class MCPUnifiedService(BaseService):
             raise MCPServiceError(f"stdio模式运行失败: {e}")
 
     async def _cleanup_services(self) -> None:
-        """清理服务资源"""
+        """清理服务资源，代理和服务端分别停止，一方失败不影响另一方"""
         try:
-            if self._proxy_service:
-                await self._proxy_service.stop()
-            if self._proxy_server:
-                await self._proxy_server.stop()
+            await self._do_stop(ServiceMode.PROXY_ONLY)
         except Exception as e:
             logger.error(f"清理代理服务失败: {e}")
 
         try:
-            if self._server_service:
-                await self._stop_mcp_server()
+            await self._do_stop(ServiceMode.SERVER_ONLY)
         except Exception as e:
             logger.error(f"清理服务端失败: {e}")
 
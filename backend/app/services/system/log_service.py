@@ -75,36 +75,57 @@ class LogService:
         """获取系统日志详情"""
         return self.db.query(SystemLog).filter(SystemLog.id == log_id).first()
 
+    @staticmethod
+    def _build_system_log(log_data: SystemLogCreate) -> SystemLog:
+        """根据请求数据构建系统日志对象"""
+        return SystemLog(
+            level=log_data.level,
+            category=log_data.category,
+            message=log_data.message,
+            details=log_data.details,
+            source=log_data.source,
+            tool_id=log_data.tool_id,
+            tool_name=log_data.tool_name,
+            stack_trace=log_data.stack_trace,
+            request_id=log_data.request_id,
+            ip_address=log_data.ip_address,
+            user_agent=log_data.user_agent,
+            timestamp=datetime.utcnow()
+        )
+
     @error_handler
-    def create_system_log(self, log_data: SystemLogCreate) -> SystemLog:
-        """创建系统日志"""
+    def create_system_log(self, log_data: SystemLogCreate, commit: bool = True) -> SystemLog:
+        """创建系统日志，commit 为 False 时只加入当前会话，随调用方的事务提交"""
         try:
-            log = SystemLog(
-                level=log_data.level,
-                category=log_data.category,
-                message=log_data.message,
-                details=log_data.details,
-                source=log_data.source,
-                tool_id=log_data.tool_id,
-                tool_name=log_data.tool_name,
-                stack_trace=log_data.stack_trace,
-                request_id=log_data.request_id,
-                ip_address=log_data.ip_address,
-                user_agent=log_data.user_agent,
-                timestamp=datetime.utcnow()
-            )
+            log = self._build_system_log(log_data)
 
             self.db.add(log)
-            self.db.commit()
-            self.db.refresh(log)
+            if commit:
+                self.db.commit()
+                self.db.refresh(log)
 
             return log
 
         except Exception as e:
-            self.db.rollback()
+            # 未提交时不回滚，避免丢弃调用方事务中的其他变更
+            if commit:
+                self.db.rollback()
             logger.error(f"创建系统日志失败: {e}", category=LogCategory.SYSTEM)
             raise LogServiceError(f"创建系统日志失败: {e}")
 
+    @error_handler
+    def create_system_logs(self, logs: List[SystemLogCreate]) -> int:
+        """批量创建系统日志，单次提交"""
+        try:
+            self.db.add_all([self._build_system_log(log_data) for log_data in logs])
+            self.db.commit()
+            return len(logs)
+
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"批量创建系统日志失败: {e}", category=LogCategory.SYSTEM)
+            raise LogServiceError(f"批量创建系统日志失败: {e}")
+
     # 操作日志
     def get_operation_logs(
         self,
@@ -2,8 +2,9 @@
 
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, func
-from typing import List, Optional, Tuple, Dict, Any
+from typing import Callable, List, Optional, Tuple, Dict, Any
 from datetime import datetime
+import asyncio
 import json
 from app.core import get_logger, LogLevel, LogCategory, create_log_context
 
@@ -25,6 +26,7 @@ from app.utils.exceptions import (
     CategoryNotFoundError
 )
 from app.core.unified_cache import cached
+from app.services.system import LogService
 
 logger = get_logger(__name__)
 
@@ -35,6 +37,15 @@ MAX_PAGE_SIZE = 100
 class ToolService:
     """工具管理服务"""
 
+    # 工具状态变更监听器，由上层服务注册，按 (工具ID, 旧状态, 新状态) 调用
+    _status_listeners: List[Callable[[int, ToolStatus, ToolStatus], None]] = []
+
+    @classmethod
+    def add_status_listener(cls, listener: Callable[[int, ToolStatus, ToolStatus], None]) -> None:
+        """注册工具状态变更监听器，重复注册同一监听器时忽略"""
+        if listener not in cls._status_listeners:
+            cls._status_listeners.append(listener)
+
     @error_handler
     def __init__(self, db: Session):
         self.db = db
@@ -91,6 +102,13 @@ class ToolService:
         """获取工具详情"""
         return self.db.query(MCPTool).filter(MCPTool.id == tool_id).first()
 
+    @error_handler
+    def get_tools_by_ids(self, tool_ids: List[int]) -> List[MCPTool]:
+        """批量获取工具"""
+        if not tool_ids:
+            return []
+        return self.db.query(MCPTool).filter(MCPTool.id.in_(tool_ids)).all()
+
     @error_handler
     @cached(ttl=300)
     def get_tool_by_name(self, name: str) -> Optional[MCPTool]:
@@ -158,7 +176,6 @@ class ToolService:
 
             # 记录系统日志
             try:
-                from ..system import LogService
                 log_service = LogService(self.db)
                 log_data = SystemLogCreate(
                     level=LogLevel.INFO,
@@ -234,90 +251,181 @@ class ToolService:
         tool_id: int,
         status: ToolStatus,
         process_id: Optional[int] = None,
-        error_message: Optional[str] = None
+        error_message: Optional[str] = None,
+        commit: bool = True
     ) -> MCPTool:
-        """更新工具状态"""
+        """更新工具状态
+
+        状态变更日志与状态写入在同一事务中提交；commit 为 False 时只 flush，由调用方统一提交
+        """
         try:
             tool = self.get_tool(tool_id)
             if not tool:
                 raise ToolNotFoundError(f"工具不存在: {tool_id}")
 
-            old_status = tool.status
-            tool.status = status
-            tool.updated_at = datetime.utcnow()
+            old_status = self._apply_status(tool, status, process_id, error_message)
+            if old_status is None:
+                return tool
 
-            if process_id is not None:
-                tool.process_id = process_id
+            if commit:
+                self.db.commit()
+                self.db.refresh(tool)
+            else:
+                self.db.flush()
 
-            if error_message:
-                tool.last_error = error_message
+            logger.info(f"工具状态更新: {tool.name} {old_status.value} -> {status.value}", category=LogCategory.SYSTEM)
 
-            # 更新时间戳
-            if status == ToolStatus.RUNNING and old_status != ToolStatus.RUNNING:
-                tool.last_started_at = datetime.utcnow()
-            elif status == ToolStatus.STOPPED and old_status == ToolStatus.RUNNING:
-                tool.last_stopped_at = datetime.utcnow()
-                tool.process_id = None
-            elif status == ToolStatus.ERROR:
-                tool.last_error_at = datetime.utcnow()
+            self.notify_status_change(tool.id, old_status, status)
+            return tool
 
-            self.db.commit()
-            self.db.refresh(tool)
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"更新工具状态失败: {e}", category=LogCategory.SYSTEM)
+            raise
 
-            logger.info(f"工具状态更新: {tool.name} {old_status.value} -> {status.value}", category=LogCategory.SYSTEM)
+    def write_tool_status(
+        self,
+        tool_id: int,
+        status: ToolStatus,
+        process_id: Optional[int] = None,
+        error_message: Optional[str] = None
+    ) -> Optional[ToolStatus]:
+        """写入并提交工具状态，返回旧状态；状态和附加信息都未变化时返回 None
 
-            # 记录系统日志
-            try:
-                from ..system import LogService
-                log_service = LogService(self.db)
+        不发送 WebSocket 通知，供在线程中执行的调用方回到事件循环后调用 notify_status_change
+        """
+        try:
+            tool = self.get_tool(tool_id)
+            if not tool:
+                raise ToolNotFoundError(f"工具不存在: {tool_id}")
 
-                # 根据状态变化确定日志级别
-                log_level = LogLevel.INFO
-                if status == ToolStatus.ERROR:
-                    log_level = LogLevel.WARNING
-                elif status == ToolStatus.STOPPED and old_status == ToolStatus.RUNNING:
-                    log_level = LogLevel.INFO
+            old_status = self._apply_status(tool, status, process_id, error_message)
+            if old_status is not None:
+                self.db.commit()
+                logger.info(f"工具状态更新: {tool.name} {old_status.value} -> {status.value}", category=LogCategory.SYSTEM)
+            return old_status
 
-                log_data = SystemLogCreate(
-                    level=log_level,
-                    category=LogCategory.TOOL,
-                    message=f"工具状态变更: {tool.name} {old_status.value} -> {status.value}",
-                    details={
-                        "tool_id": tool.id,
-                        "tool_name": tool.name,
-                        "old_status": old_status.value,
-                        "new_status": status.value,
-                        "process_id": process_id,
-                        "error_message": error_message
-                    }
-                )
-                log_service.create_system_log(log_data)
-            except Exception as log_error:
-                logger.warning(f"记录系统日志失败: {log_error}", category=LogCategory.SYSTEM)
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"更新工具状态失败: {e}", category=LogCategory.SYSTEM)
+            raise
 
-            # 发送 WebSocket 通知
-            try:
-                import asyncio
-                from ...websocket import notify_tool_status_change
-
-                # 在后台发送通知，不阻塞当前操作
-                asyncio.create_task(
-                    notify_tool_status_change(
-                        tool_id=str(tool.id),
-                        status=status.value,
-                        details={"old_status": old_status.value}
-                    )
-                )
-            except Exception as e:
-                logger.warning(f"发送工具状态变更通知失败: {e}", category=LogCategory.SYSTEM)
+    def bulk_update_status(
+        self,
+        updates: List[Tuple[int, ToolStatus, Optional[str]]]
+    ) -> List[Tuple[int, ToolStatus, ToolStatus]]:
+        """批量更新工具状态，一次查询、一次提交
 
-            return tool
+        updates 为按时间顺序排列的 (工具ID, 状态, 错误信息)，不存在的工具跳过；
+        返回 (工具ID, 旧状态, 新状态) 列表，WebSocket 通知由调用方在事件循环中发送
+        """
+        try:
+            tools = {tool.id: tool for tool in self.get_tools_by_ids(list({tool_id for tool_id, _, _ in updates}))}
+            changes = []
+            for tool_id, status, error_message in updates:
+                tool = tools.get(tool_id)
+                if tool is None:
+                    logger.warning(f"批量更新状态时工具不存在: {tool_id}", category=LogCategory.SYSTEM)
+                    continue
+                old_status = self._apply_status(tool, status, None, error_message)
+                if old_status is not None:
+                    changes.append((tool_id, old_status, status))
+
+            if changes:
+                self.db.commit()
+                logger.info(f"批量更新工具状态: {len(changes)} 条", category=LogCategory.SYSTEM)
+            return changes
 
         except Exception as e:
             self.db.rollback()
-            logger.error(f"更新工具状态失败: {e}", category=LogCategory.SYSTEM)
+            logger.error(f"批量更新工具状态失败: {e}", category=LogCategory.SYSTEM)
             raise
 
+    def _apply_status(
+        self,
+        tool: MCPTool,
+        status: ToolStatus,
+        process_id: Optional[int],
+        error_message: Optional[str]
+    ) -> Optional[ToolStatus]:
+        """在当前事务中写入工具状态及状态变更日志，返回旧状态；状态和附加信息都未变化时返回 None"""
+        # 状态和附加信息都未变化时跳过写入、日志和通知
+        if tool.status == status and process_id is None and not error_message:
+            return None
+
+        old_status = tool.status
+        tool.status = status
+        tool.updated_at = datetime.utcnow()
+
+        if process_id is not None:
+            tool.process_id = process_id
+
+        if error_message:
+            tool.last_error = error_message
+
+        # 更新时间戳
+        if status == ToolStatus.RUNNING and old_status != ToolStatus.RUNNING:
+            tool.last_started_at = datetime.utcnow()
+        elif status == ToolStatus.STOPPED and old_status == ToolStatus.RUNNING:
+            tool.last_stopped_at = datetime.utcnow()
+            tool.process_id = None
+        elif status == ToolStatus.ERROR:
+            tool.last_error_at = datetime.utcnow()
+
+        # 记录系统日志
+        try:
+            log_service = LogService(self.db)
+
+            # 根据状态变化确定日志级别
+            log_level = LogLevel.INFO
+            if status == ToolStatus.ERROR:
+                log_level = LogLevel.WARNING
+            elif status == ToolStatus.STOPPED and old_status == ToolStatus.RUNNING:
+                log_level = LogLevel.INFO
+
+            log_data = SystemLogCreate(
+                level=log_level,
+                category=LogCategory.TOOL,
+                message=f"工具状态变更: {tool.name} {old_status.value} -> {status.value}",
+                details={
+                    "tool_id": tool.id,
+                    "tool_name": tool.name,
+                    "old_status": old_status.value,
+                    "new_status": status.value,
+                    "process_id": process_id,
+                    "error_message": error_message
+                }
+            )
+            log_service.create_system_log(log_data, commit=False)
+        except Exception as log_error:
+            logger.warning(f"记录系统日志失败: {log_error}", category=LogCategory.SYSTEM)
+
+        return old_status
+
+    @staticmethod
+    def notify_status_change(tool_id: int, old_status: ToolStatus, status: ToolStatus) -> None:
+        """通知状态变更监听器并发送 WebSocket 通知，需在事件循环线程中调用"""
+        for listener in ToolService._status_listeners:
+            try:
+                listener(tool_id, old_status, status)
+            except Exception as e:
+                logger.warning(f"工具状态变更监听器执行失败: {e}", category=LogCategory.SYSTEM)
+
+        try:
+            # app.websocket 依赖本模块，只能在调用时导入
+            from ...websocket import notify_tool_status_change
+
+            # 在后台发送通知，不阻塞当前操作
+            asyncio.create_task(
+                notify_tool_status_change(
+                    tool_id=str(tool_id),
+                    status=status.value,
+                    details={"old_status": old_status.value}
+                )
+            )
+        except Exception as e:
+            logger.warning(f"发送工具状态变更通知失败: {e}", category=LogCategory.SYSTEM)
+
     @error_handler
     def increment_restart_count(self, tool_id: int) -> MCPTool:
         """增加重启计数"""
@@ -344,7 +452,7 @@ class ToolService:
     async def start_tool(self, tool_id: int, force: bool = False) -> bool:
         """启动工具"""
         try:
-            from ..mcp import MCPService
+            from ..mcp import get_mcp_service
 
             # 检查工具是否存在
             tool = self.get_tool(tool_id)
@@ -356,7 +464,7 @@ class ToolService:
                 raise ToolValidationError(f"工具无法启动: {tool.name} (状态: {tool.status.value})")
 
             # 使用 MCP 服务启动工具
-            mcp_service = MCPService()
+            mcp_service = get_mcp_service()
             result = await mcp_service.start_tool(tool_id, force)
 
             logger.info(f"工具启动{'成功' if result else '失败'}: {tool.name} (ID: {tool_id})", category=LogCategory.SYSTEM)
@@ -370,7 +478,7 @@ class ToolService:
     async def stop_tool(self, tool_id: int, force: bool = False) -> bool:
         """停止工具"""
         try:
-            from ..mcp import MCPService
+            from ..mcp import get_mcp_service
 
             # 检查工具是否存在
             tool = self.get_tool(tool_id)
@@ -382,7 +490,7 @@ class ToolService:
                 raise ToolValidationError(f"工具无法停止: {tool.name} (状态: {tool.status.value})")
 
             # 使用 MCP 服务停止工具
-            mcp_service = MCPService()
+            mcp_service = get_mcp_service()
             result = await mcp_service.stop_tool(tool_id, force)
 
             logger.info(f"工具停止{'成功' if result else '失败'}: {tool.name} (ID: {tool_id})", category=LogCategory.SYSTEM)
@@ -397,7 +505,7 @@ class ToolService:
 
         """重启工具"""
         try:
-            from ..mcp import MCPService
+            from ..mcp import get_mcp_service
 
             # 检查工具是否存在
             tool = self.get_tool(tool_id)
@@ -405,7 +513,7 @@ class ToolService:
                 raise ToolNotFoundError(f"工具不存在: {tool_id}")
 
             # 使用 MCP 服务重启工具
-            mcp_service = MCPService()
+            mcp_service = get_mcp_service()
             result = await mcp_service.restart_tool(tool_id, force)
 
             logger.info(f"工具重启{'成功' if result else '失败'}: {tool.name} (ID: {tool_id})", category=LogCategory.SYSTEM)
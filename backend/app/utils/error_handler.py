@@ -180,6 +180,11 @@ class ErrorHandler:
                 await asyncio.sleep(delay)
 
         # 所有重试都失败了
+        self.raise_retry_exhausted(last_exception, retry_config)
+
+    @staticmethod
+    def raise_retry_exhausted(last_exception: Exception, retry_config: RetryConfig) -> None:
+        """重试耗尽后抛出最终异常"""
         if isinstance(last_exception, MCPSException):
             last_exception.add_context("retry_attempts", retry_config.max_attempts)
             raise last_exception
@@ -382,6 +387,88 @@ def with_retry(
         return wrapper
     return decorator
 
+def mcp_endpoint(
+    retry_config: Optional[RetryConfig] = None,
+    circuit_breaker_name: Optional[str] = None,
+    circuit_breaker_config: Optional[CircuitBreakerConfig] = None,
+    translate_errors: bool = False
+):
+    """MCP 服务方法装饰器
+
+    在同一层包装中完成熔断检查、重试和错误转换，等价于
+    ``@with_retry(...)`` 叠加 ``@app.core.error_handler``，但每次调用只多一层函数帧。
+    translate_errors 为 True 时，每次尝试中的非 MCPSError 异常会交给统一错误处理器记录并包装为 MCPSError；
+    是否重试按包装前的原始异常判断，非瞬时错误（如命令不存在）不会重试。未指定 retry_config 时只执行一次。
+    """
+    from app.core.unified_error import (
+        ErrorCategory, ErrorContext, ErrorSeverity, MCPSError, get_error_handler
+    )
+
+    retry_config = retry_config or RetryConfig(max_attempts=1)
+
+    def decorator(func):
+        # 熔断器在装饰时解析，调用时不再查表
+        circuit_breaker = None
+        if circuit_breaker_name and circuit_breaker_config:
+            circuit_breaker = error_handler.get_circuit_breaker(circuit_breaker_name, circuit_breaker_config)
+
+        def translate(e: Exception) -> Exception:
+            """按 app.core.error_handler 的方式记录并包装异常"""
+            context = ErrorContext(service_name=func.__module__, method_name=func.__name__)
+            error_info = get_error_handler().handle_error(e, context)
+            mcps_error = MCPSError(
+                message=str(e),
+                error_code="WRAPPED_ERROR",
+                category=ErrorCategory.UNKNOWN,
+                severity=ErrorSeverity.MEDIUM,
+                context=context,
+                inner_error=e
+            )
+            mcps_error.error_id = error_info.error_id
+            mcps_error.__cause__ = e
+            return mcps_error
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if circuit_breaker and not circuit_breaker.can_execute():
+                raise MCPSException(
+                    f"熔断器开启，暂时无法执行: {circuit_breaker_name}",
+                    code="CIRCUIT_BREAKER_OPEN"
+                )
+
+            last_exception = None
+            for attempt in range(1, retry_config.max_attempts + 1):
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    retryable = retry_config.is_retryable(e)
+                    if translate_errors and not isinstance(e, MCPSError):
+                        e = translate(e)
+                    last_exception = e
+
+                    if circuit_breaker:
+                        circuit_breaker.record_failure(e)
+
+                    if attempt == retry_config.max_attempts or not retryable:
+                        break
+
+                    delay = retry_config.calculate_delay(attempt)
+                    logger.warning(
+                        f"执行失败，{delay:.2f}秒后重试 (尝试 {attempt}/{retry_config.max_attempts}): {e}"
+                    )
+                    await asyncio.sleep(delay)
+                    continue
+
+                if circuit_breaker:
+                    circuit_breaker.record_success()
+                if attempt > 1:
+                    logger.info(f"重试成功，尝试次数: {attempt}")
+                return result
+
+            error_handler.raise_retry_exhausted(last_exception, retry_config)
+        return wrapper
+    return decorator
+
 def handle_errors(func):
     """错误处理装饰器"""
     @functools.wraps(func)
@@ -91,7 +91,9 @@ class MCPClient:
         if not self.host or not self.port:
             raise MCPConnectionError("服务器连接需要host和port")
 
-        self.session = aiohttp.ClientSession()
+        # 重连时沿用保留的会话及其连接池
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession()
 
         # 测试连接
         try:
@@ -193,10 +195,17 @@ class MCPClient:
         except Exception as e:
             logger.error(f"关闭连接时出错: {e}")
 
-    async def disconnect(self):
-        """断开连接（兼容性方法）"""
+    async def disconnect(self, keep_session: bool = False):
+        """断开连接；keep_session 为 True 时保留 HTTP 会话，供 reconnect 复用"""
+        if keep_session and self.connection_type == "server":
+            self.connected = False
+            return
         await self.close()
 
+    async def reconnect(self, timeout: int = 30) -> bool:
+        """重新连接，服务器模式下复用保留的 HTTP 会话"""
+        return await self.connect(timeout)
+
     async def is_connected(self) -> bool:
         """检查连接状态"""
         logger.debug(f"检查MCP客户端连接状态: connected={self.connected}, type={self.connection_type}")
@@ -0,0 +1,115 @@
+"""MCPProxyServer 会话池的测试"""
+
+import asyncio
+
+from app.services.mcp.mcp_proxy_server import MCPProxyServer, PooledSession
+
+
+class _SlowClient:
+    def __init__(self):
+        self.enters = 0
+        self.release = asyncio.Event()
+
+    async def __aenter__(self):
+        self.enters += 1
+        await self.release.wait()
+        return self
+
+    async def __aexit__(self, *exc):
+        return None
+
+
+def test_client_factory_warms_released_session_once():
+    """会话已回收时多次调用只启动一个预热任务，完成后移除"""
+    server = MCPProxyServer()
+
+    async def run():
+        client = _SlowClient()
+        session = PooledSession(client)
+        factory = server._pooled_client_factory("demo", session)
+
+        assert factory() is client
+        assert factory() is client
+        assert list(server._warm_tasks) == ["demo"]
+
+        task = server._warm_tasks["demo"]
+        client.release.set()
+        await task
+        await asyncio.sleep(0)
+        return client, session
+
+    client, session = asyncio.run(run())
+
+    assert client.enters == 1
+    assert session.held
+    assert server._warm_tasks == {}
+
+
+def test_running_status_change_invalidates_tools_cache(monkeypatch):
+    """工具进入或离开运行状态时清除运行中工具缓存"""
+    from app import websocket
+    from app.models.tool import ToolStatus
+    from app.services.tools.tool_service import ToolService
+
+    async def notify(**kwargs):
+        return None
+
+    monkeypatch.setattr(websocket, "notify_tool_status_change", notify)
+    server = MCPProxyServer()
+
+    async def run():
+        server._tools_cache = (float("inf"), [])
+        ToolService.notify_status_change(1, ToolStatus.STOPPED, ToolStatus.STARTING)
+        kept = server._tools_cache is not None
+        ToolService.notify_status_change(1, ToolStatus.STARTING, ToolStatus.RUNNING)
+        await asyncio.sleep(0)
+        return kept
+
+    assert asyncio.run(run())
+    assert server._tools_cache is None
+
+
+def test_cancelled_warm_releases_session_hold():
+    """预热任务被取消时撤销会话占位，之后可以重新预热"""
+    server = MCPProxyServer()
+
+    async def run():
+        client = _SlowClient()
+        session = PooledSession(client)
+        factory = server._pooled_client_factory("demo", session)
+
+        factory()
+        task = server._warm_tasks["demo"]
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        held_after_cancel = session.held
+
+        factory()
+        retry = server._warm_tasks["demo"]
+        client.release.set()
+        await retry
+        return held_after_cancel, session, client
+
+    held_after_cancel, session, client = asyncio.run(run())
+
+    assert not held_after_cancel
+    assert session.held
+    assert client.enters == 2
+    assert server._warm_tasks == {}
+
+
+def test_discard_warm_task_keeps_newer_task():
+    """旧预热任务的回调不会移除同一工具的新任务"""
+    server = MCPProxyServer()
+
+    async def run():
+        old = asyncio.create_task(asyncio.sleep(0))
+        new = asyncio.create_task(asyncio.sleep(0))
+        server._warm_tasks["demo"] = new
+        server._discard_warm_task("demo", old)
+        kept = server._warm_tasks.get("demo") is new
+        await asyncio.gather(old, new)
+        return kept
+
+    assert asyncio.run(run())
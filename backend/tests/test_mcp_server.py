@@ -0,0 +1,91 @@
+"""MCPSServer 按能力注册工具的测试"""
+
+import asyncio
+from types import SimpleNamespace
+
+from fastmcp import Client
+
+from app.services.mcp import mcp_server
+from app.services.mcp.mcp_server import MCPSServer
+
+
+class _FakeConfig:
+    def __init__(self, values):
+        self._values = values
+
+    def get(self, key, default=None):
+        return self._values.get(key, default)
+
+
+class _FakeClient:
+    def __init__(self):
+        self.calls = []
+
+    async def call_tool(self, name, arguments):
+        self.calls.append((name, arguments))
+        return {"content": [{"type": "text", "text": f"{name}:{arguments.get('text')}"}], "isError": False}
+
+
+def test_expose_capability_tools_registers_functions(monkeypatch):
+    """开启 expose_capability_tools 后，每个能力注册为可调用的工具"""
+    server = MCPSServer()
+    client = _FakeClient()
+    tool = SimpleNamespace(name="demo")
+    capabilities = [
+        {"name": "echo", "description": "回显输入"},
+        {"name": "shout", "description": "大声回显"},
+    ]
+
+    async def ready(timeout=None):
+        return True
+
+    async def discover(t):
+        return t, client, capabilities
+
+    monkeypatch.setattr(mcp_server, "get_unified_config_manager",
+                        lambda: _FakeConfig({"mcp.server.expose_capability_tools": True}))
+    monkeypatch.setattr(server.mcp_service, "wait_until_ready", ready)
+    monkeypatch.setattr(server, "_load_tools", lambda running_only=False: [tool])
+    monkeypatch.setattr(server, "_discover_tool", discover)
+
+    async def run():
+        await server._register_actual_tools()
+        tools = await server.server.get_tools()
+        async with Client(server.server) as mcp_client:
+            result = await mcp_client.call_tool("echo", {"input": '{"text": "hi"}'})
+        return tools, result
+
+    tools, result = asyncio.run(run())
+
+    assert {"echo", "shout"} <= set(tools)
+    assert tools["echo"].description == "回显输入"
+    assert client.calls == [("echo", {"text": "hi"})]
+    assert "echo:hi" in result.content[0].text
+
+
+def test_get_metrics_registered_without_capability_tools(monkeypatch):
+    """未开启 expose_capability_tools 时仍注册 get_metrics，且不按能力注册工具"""
+    server = MCPSServer()
+    client = _FakeClient()
+    tool = SimpleNamespace(name="demo")
+
+    async def ready(timeout=None):
+        return True
+
+    async def discover(t):
+        return t, client, [{"name": "echo", "description": "回显输入"}]
+
+    monkeypatch.setattr(mcp_server, "get_unified_config_manager",
+                        lambda: _FakeConfig({"mcp.server.expose_capability_tools": False}))
+    monkeypatch.setattr(server.mcp_service, "wait_until_ready", ready)
+    monkeypatch.setattr(server, "_load_tools", lambda running_only=False: [tool])
+    monkeypatch.setattr(server, "_discover_tool", discover)
+
+    async def run():
+        await server._register_actual_tools()
+        return await server.server.get_tools()
+
+    tools = asyncio.run(run())
+
+    assert "get_metrics" in tools
+    assert "echo" not in tools
@@ -0,0 +1,79 @@
+"""MCPService 工具启停的测试"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.utils.exceptions import ProcessStartError
+from app.models.tool import MCPTool, ToolStatus
+from app.services.mcp.mcp_service import MCPService
+from app.services.tools.tool_service import ToolService
+
+
+def test_start_failure_records_last_error(monkeypatch):
+    """进程启动失败时，ERROR 状态连同失败原因一起写入"""
+    service = MCPService()
+    tool = SimpleNamespace(id=1, name="demo", status=ToolStatus.STOPPED, enabled=True)
+    statuses = []
+
+    async def fail_start(t):
+        raise ProcessStartError("进程启动失败: demo")
+
+    async def noop(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(service, "_start_process", fail_start)
+    monkeypatch.setattr(service, "_cleanup_process", noop)
+    monkeypatch.setattr(service, "_invalidate_tool_lists", noop)
+    monkeypatch.setattr(service, "_enqueue_status",
+                        lambda tool_id, status, error_message=None: statuses.append((tool_id, status, error_message)))
+
+    with pytest.raises(Exception):
+        asyncio.run(service.start_tool(tool))
+
+    assert statuses == [(1, ToolStatus.ERROR, "进程启动失败: demo")]
+
+
+def _memory_session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def test_stop_tool_writes_status_off_loop_and_notifies_on_loop(monkeypatch):
+    """停止工具时状态在线程中提交，状态通知回到事件循环中发送"""
+    session_factory = _memory_session_factory()
+    with session_factory() as db:
+        db.add(MCPTool(name="demo", display_name="demo", command="demo", status=ToolStatus.RUNNING))
+        db.commit()
+        tool_id = db.query(MCPTool).one().id
+
+    service = MCPService(session_factory=session_factory)
+    notified = []
+
+    async def noop(*args, **kwargs):
+        return None
+
+    async def stopped(tool_id, force=False):
+        return True
+
+    def notify(tool_id, old_status, status):
+        asyncio.get_running_loop()
+        notified.append((tool_id, old_status, status))
+
+    monkeypatch.setattr(service, "_release_client", noop)
+    monkeypatch.setattr(service, "_stop_process", stopped)
+    monkeypatch.setattr(service, "_invalidate_tool_lists", noop)
+    monkeypatch.setattr(service, "_enqueue_log", lambda log_data: None)
+    monkeypatch.setattr(ToolService, "notify_status_change", staticmethod(notify))
+
+    assert asyncio.run(service.stop_tool(tool_id))
+
+    with session_factory() as db:
+        assert db.get(MCPTool, tool_id).status == ToolStatus.STOPPED
+    assert notified == [(tool_id, ToolStatus.RUNNING, ToolStatus.STOPPED)]
@@ -0,0 +1,34 @@
+"""MCPUnifiedService 模式切换的测试"""
+
+import asyncio
+
+import pytest
+
+from app.services.mcp.mcp_unified_service import MCPUnifiedService, ServiceMode
+
+
+def test_switch_mode_rolls_back_when_start_fails(monkeypatch):
+    """新模式启动失败时恢复原模式并重新启动原模式的服务"""
+    service = MCPUnifiedService()
+    service._mode = ServiceMode.SERVER_ONLY
+    service._running = True
+    started = []
+
+    async def do_start(mode):
+        started.append(mode)
+        if mode == ServiceMode.PROXY_ONLY:
+            raise RuntimeError("端口被占用")
+
+    async def noop(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(service, "_do_start", do_start)
+    monkeypatch.setattr(service, "_do_stop", noop)
+    monkeypatch.setattr(service, "_reinitialize_services", noop)
+
+    with pytest.raises(Exception):
+        asyncio.run(service.switch_mode(enable_server=False, enable_proxy=True))
+
+    assert service.mode == ServiceMode.SERVER_ONLY
+    assert service.is_running
+    assert started == [ServiceMode.PROXY_ONLY, ServiceMode.SERVER_ONLY]